@@ -1,20 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import os
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from typing import Dict, Any
 from datetime import datetime
+import orjson
 
 from app.database import get_db, AsyncSessionLocal
 from app.models.conversation import Conversation, TranscriptSegment, ConversationStatus
 from app.models.extraction import MortgageExtraction, ActionItem
 from app.models.client import Client
 from app.models.document import DocumentChecklist, DocumentItem
+from app.schemas.extraction import TranscriptBatchRequest
 from app.services.google_drive import google_drive_service
 from app.services.transcription import transcription_service
 from app.services.diarization import diarization_service
 from app.services.extraction import extraction_service
-from app.services.email_generator import email_generator_service
+from app.services.email_generator import email_generator_service, get_loan_docs
+from app.services.email import email_service
 from app.config import get_settings
 
 router = APIRouter()
@@ -404,14 +410,34 @@ async def re_extract_from_transcript(
     }
 
 
-@router.post("/conversations/{conversation_id}/generate-email")
-async def generate_follow_up_email(
-    conversation_id: int,
-    db: AsyncSession = Depends(get_db)
-) -> Dict[str, Any]:
-    """Generate a follow-up email based on a processed conversation."""
-    from app.services.email_generator import get_documents_for_loan_type
+@router.post("/extract/batch", response_class=ORJSONResponse)
+async def extract_batch(request: TranscriptBatchRequest) -> Dict[str, Any]:
+    """
+    Extract loan details and action items from a batch of transcripts.
+    Results are returned in the same order as the submitted transcripts.
+    """
+    if not request.transcripts:
+        raise HTTPException(status_code=400, detail="No transcripts provided")
+    
+    if len(request.transcripts) > settings.extraction_batch_max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.extraction_batch_max_size} transcripts per batch"
+        )
+    
+    if request.concurrency is not None and request.concurrency < 1:
+        raise HTTPException(status_code=400, detail="Concurrency must be at least 1")
     
+    results = await extraction_service.process_many(
+        request.transcripts,
+        concurrency=request.concurrency
+    )
+    
+    return {"count": len(results), "results": results}
+
+
+async def _load_email_context(conversation_id: int, db: AsyncSession) -> Dict[str, Any]:
+    """Load the follow-up email inputs for a processed conversation."""
     # Get conversation with related data
     result = await db.execute(
         select(Conversation)
@@ -449,8 +475,7 @@ async def generate_follow_up_email(
         }
     
     # Get required documents based on loan type
-    loan_docs_info = get_documents_for_loan_type(loan_type)
-    required_documents = loan_docs_info.get('documents', [])
+    required_documents = get_loan_docs(loan_type)
     
     print(f"\n📧 GENERATING EMAIL for conversation {conversation_id}")
     print(f"   Client: {client_name}")
@@ -464,20 +489,55 @@ async def generate_follow_up_email(
         for a in conversation.action_items
     ]
     
+    return {
+        "client_name": client_name,
+        "transcript": conversation.raw_transcript or "",
+        "mortgage_data": mortgage_data,
+        "action_items": action_items,
+        "required_documents": required_documents,
+    }
+
+
+@router.post("/conversations/{conversation_id}/generate-email", response_class=ORJSONResponse)
+async def generate_follow_up_email(
+    conversation_id: int,
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """Generate a follow-up email based on a processed conversation."""
+    email_context = await _load_email_context(conversation_id, db)
+    
     # Generate email with loan details and document requirements
-    email = await email_generator_service.generate_follow_up_email(
-        client_name=client_name,
-        transcript=conversation.raw_transcript or "",
-        mortgage_data=mortgage_data,
-        action_items=action_items,
-        required_documents=required_documents
-    )
+    email = await email_generator_service.generate_follow_up_email(**email_context)
     
     print(f"   ✓ Email generated successfully")
     
     return email
 
 
+@router.post("/conversations/{conversation_id}/generate-email/stream")
+async def stream_follow_up_email(
+    conversation_id: int,
+    db: AsyncSession = Depends(get_db)
+) -> StreamingResponse:
+    """
+    Stream a follow-up email as Server-Sent Events while it is generated.
+    
+    Emits a {"subject"} event as soon as the subject is known, {"body_delta"}
+    events as the body grows, and a final {"subject", "body"} event.
+    """
+    email_context = await _load_email_context(conversation_id, db)
+    
+    async def event_stream():
+        try:
+            async for event in email_generator_service.generate_follow_up_email_stream(**email_context):
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+        except Exception as e:
+            print(f"Email streaming error: {e}")
+            yield b"event: error\ndata: " + orjson.dumps({"detail": str(e)}) + b"\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @router.post("/conversations/{conversation_id}/send-email")
 async def send_follow_up_email(
     conversation_id: int,
@@ -491,8 +551,6 @@ async def send_follow_up_email(
         conversation_id: The conversation ID
         email_data: Dictionary with 'subject' and 'body' keys
     """
-    from app.services.email import email_service
-    
     # Get conversation with client info
     result = await db.execute(
         select(Conversation)
@@ -565,6 +623,96 @@ async def list_google_drive_files(
         raise HTTPException(status_code=500, detail=f"Failed to list files: {str(e)}")
 
 
+async def import_changed_drive_files_task():
+    """
+    Background task run on a Drive push notification: import MP3 files that
+    appeared in the watched folder as pending conversations.
+    """
+    try:
+        files = await google_drive_service.list_changed_mp3_files()
+    except Exception as e:
+        print(f"Failed to read Drive changes: {e}")
+        return
+    
+    if not files:
+        return
+    
+    async with AsyncSessionLocal() as db:
+        existing = await db.execute(
+            select(Conversation.google_drive_file_id).where(
+                Conversation.google_drive_file_id.in_([f['id'] for f in files])
+            )
+        )
+        already_imported = set(existing.scalars().all())
+        
+        for file in files:
+            if file['id'] in already_imported:
+                continue
+            
+            try:
+                download_path = os.path.join(settings.upload_dir, file['name'])
+                await google_drive_service.download_file_parallel(
+                    file['id'],
+                    download_path,
+                    size=int(file.get('size') or 0)
+                )
+                
+                db.add(Conversation(
+                    google_drive_file_id=file['id'],
+                    original_filename=file['name'],
+                    file_path=download_path,
+                    status=ConversationStatus.PENDING
+                ))
+                await db.commit()
+                print(f"📥 Imported {file['name']} from Google Drive")
+            except Exception as e:
+                await db.rollback()
+                print(f"Failed to import {file.get('name')} from Google Drive: {e}")
+
+
+@router.post("/google-drive/watch")
+async def watch_google_drive(webhook_url: str):
+    """Register a webhook for Google Drive change notifications."""
+    # Without a shared secret anyone could post fake notifications
+    if not settings.google_drive_webhook_token:
+        raise HTTPException(
+            status_code=400,
+            detail="GOOGLE_DRIVE_WEBHOOK_TOKEN must be configured to register a watch"
+        )
+    
+    try:
+        channel = await google_drive_service.register_watch(
+            uuid.uuid4().hex,
+            webhook_url,
+            token=settings.google_drive_webhook_token
+        )
+        return {"channel": channel}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to register watch: {str(e)}")
+
+
+@router.post("/google-drive/webhook")
+async def google_drive_webhook(
+    background_tasks: BackgroundTasks,
+    x_goog_resource_state: str = Header(None),
+    x_goog_channel_token: str = Header(None)
+):
+    """Receive Google Drive push notifications and import new MP3 files."""
+    if (
+        not settings.google_drive_webhook_token
+        or x_goog_channel_token != settings.google_drive_webhook_token
+    ):
+        raise HTTPException(status_code=403, detail="Invalid channel token")
+    
+    # "sync" only confirms the channel was created
+    if x_goog_resource_state != "sync":
+        background_tasks.add_task(import_changed_drive_files_task)
+    
+    return {"status": "ok"}
+
+
 @router.post("/google-drive/import/{file_id}")
 async def import_from_google_drive(
     file_id: str,
@@ -578,11 +726,14 @@ async def import_from_google_drive(
         metadata = await google_drive_service.get_file_metadata(file_id)
         
         # Download file
-        import os
         download_path = os.path.join(settings.upload_dir, metadata['name'])
         os.makedirs(settings.upload_dir, exist_ok=True)
         
-        await google_drive_service.download_file(file_id, download_path)
+        await google_drive_service.download_file_parallel(
+            file_id,
+            download_path,
+            size=int(metadata.get('size') or 0)
+        )
         
         # Create conversation record
         conversation = Conversation(
@@ -10,13 +10,58 @@ class Settings(BaseSettings):
     # Google Drive
     google_drive_credentials_path: str = "./credentials/google_service_account.json"
     google_drive_folder_id: str = ""
+    # Shared secret echoed back by Drive on push notifications; required
+    # before a change watch can be registered or notifications accepted
+    google_drive_webhook_token: str = ""
+    # Bulk ingestion: downloaded files waiting for transcription, and the
+    # number of concurrent transcription workers
+    ingest_queue_size: int = 4
+    ingest_transcribe_workers: int = 4
     
     # OpenAI
     openai_api_key: str = ""
+    # Maximum concurrent Whisper API requests (keep under the org rate limit)
+    whisper_concurrency: int = 4
+    # Transcode to 16 kHz mono Opus before upload (Whisper resamples to this
+    # anyway); needs ffmpeg, falls back to the original file without it
+    whisper_preencode: bool = True
+    # "openai" (Whisper API) or "local" (faster-whisper on this machine)
+    whisper_backend: str = "openai"
+    local_whisper_model: str = "small"
+    local_whisper_device: str = "cpu"
+    local_whisper_compute_type: str = "int8"
+    # Cache Whisper results on disk, keyed by a hash of the audio and options
+    transcript_cache_enabled: bool = True
+    transcript_cache_dir: str = "./cache/transcripts"
     
     # Gemini
     gemini_api_key: str = ""
     gemini_model: str = "gemini-2.0-flash"
+    # Transcripts are only summarized when at least this many times longer
+    # than the summary's token budget; shorter ones are sent as-is, since the
+    # summary would save few tokens for the cost of an extra Gemini call
+    summary_min_compression: float = 4.0
+    
+    # LLM response cache: in-memory LRU (0 disables), plus opt-in disk tier
+    # for replaying identical prompts
+    llm_memory_cache_size: int = 1024
+    llm_cache_enabled: bool = False
+    llm_cache_dir: str = "./cache/llm"
+    llm_cache_size_limit: int = 10 * 2**30
+    
+    # Semantic cache (serves near-duplicate inputs; development/replay only)
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.92
+    embedding_model: str = "all-MiniLM-L6-v2"
+    
+    # Extract from the raw transcript instead of its condensed summary
+    # (audit mode; costs more input tokens on long calls)
+    extraction_audit_mode: bool = False
+    
+    # Maximum transcripts extracted concurrently by batch processing, and
+    # per batch request
+    extraction_batch_concurrency: int = 32
+    extraction_batch_max_size: int = 500
     
     # Resend Email
     resend_api_key: str = ""
@@ -31,6 +76,7 @@ class Settings(BaseSettings):
     # App
     debug: bool = True
     upload_dir: str = "./uploads"
+    executor_max_workers: int = 8
     
     class Config:
         env_file = ".env"
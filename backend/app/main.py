@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
@@ -5,6 +7,12 @@ from contextlib import asynccontextmanager
 from app.api import api_router
 from app.database import init_db
 from app.config import get_settings
+from app.services.diarization import diarization_service
+from app.services.google_drive import google_drive_service
+from app.services.extraction import extraction_service
+from app.services.email_generator import email_generator_service
+from app.services.summarization import summarization_service
+from app.services.transcription import transcription_service
 
 # Import models so they register with Base.metadata before init_db()
 from app.models import (  # noqa: F401
@@ -21,11 +29,50 @@ from app.models import (  # noqa: F401
 settings = get_settings()
 
 
+async def warmup():
+    """
+    Initialize the external-service clients up front so the first request
+    does not pay for credential loading, client construction or (for local
+    Whisper) the model load. Services that are not configured are skipped.
+    """
+    services = {
+        "Google Drive": google_drive_service,
+        "Transcription": transcription_service,
+    }
+    # Build the shared Gemini model up front so requests never pay for it
+    if settings.gemini_api_key:
+        services.update({
+            "Diarization": diarization_service,
+            "Extraction": extraction_service,
+            "Email generator": email_generator_service,
+            "Summarization": summarization_service,
+        })
+    
+    results = await asyncio.gather(
+        *(service.initialize() for service in services.values()),
+        return_exceptions=True
+    )
+    for name, result in zip(services, results):
+        if isinstance(result, Exception):
+            print(f"⚠️ {name} not warmed up: {result}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup."""
+    """Initialize database, thread pool and external services on startup."""
+    # Bound the default executor used by asyncio.to_thread so concurrent
+    # blocking calls cannot spawn an unbounded number of threads
+    executor = ThreadPoolExecutor(
+        max_workers=settings.executor_max_workers,
+        thread_name_prefix="worker",
+    )
+    asyncio.get_running_loop().set_default_executor(executor)
     await init_db()
+    await warmup()
     yield
+    await google_drive_service.close()
+    await transcription_service.close()
+    executor.shutdown(wait=False)
 
 
 app = FastAPI(
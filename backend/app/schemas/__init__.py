@@ -11,6 +11,7 @@ from app.schemas.extraction import (
     MortgageExtractionUpdate,
     ActionItemResponse,
     ActionItemUpdate,
+    TranscriptBatchRequest,
 )
 from app.schemas.document import (
     DocumentChecklistCreate,
@@ -33,6 +34,7 @@ __all__ = [
     "MortgageExtractionUpdate",
     "ActionItemResponse",
     "ActionItemUpdate",
+    "TranscriptBatchRequest",
     "DocumentChecklistCreate",
     "DocumentChecklistResponse",
     "DocumentItemCreate",
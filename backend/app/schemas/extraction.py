@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 
@@ -89,3 +89,7 @@ class ActionItemUpdate(BaseModel):
     is_verified: Optional[int] = None
     verified_text: Optional[str] = None
 
+
+class TranscriptBatchRequest(BaseModel):
+    transcripts: List[str]
+    concurrency: Optional[int] = None
@@ -3,6 +3,8 @@ from app.services.transcription import TranscriptionService
 from app.services.diarization import DiarizationService
 from app.services.extraction import ExtractionService
 from app.services.email_generator import EmailGeneratorService
+from app.services.summarization import SummarizationService
+from app.services.ingestion import IngestionService
 
 __all__ = [
     "GoogleDriveService",
@@ -10,5 +12,7 @@ __all__ = [
     "DiarizationService",
     "ExtractionService",
     "EmailGeneratorService",
+    "SummarizationService",
+    "IngestionService",
 ]
 
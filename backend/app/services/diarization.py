@@ -1,11 +1,23 @@
-import asyncio
-import json
+import io
 from typing import List, Dict, Any, Optional
 import google.generativeai as genai
+import orjson
 from app.config import get_settings
+from app.services.gemini import DETERMINISTIC_SAMPLING, get_model
+from app.services.llm_cache import llm_cache
 
 settings = get_settings()
 
+# Long ASR artifacts add tokens without helping speaker identification
+MAX_SEGMENT_CHARS = 500
+
+# The speaker map grows with the segment count, so it gets a generous cap
+DIARIZATION_GENERATION_CONFIG = genai.GenerationConfig(
+    **DETERMINISTIC_SAMPLING,
+    max_output_tokens=8192,
+    response_mime_type="application/json",
+)
+
 
 class DiarizationService:
     """
@@ -23,10 +35,17 @@ class DiarizationService:
             return
         
         if settings.gemini_api_key:
-            genai.configure(api_key=settings.gemini_api_key)
-            self.model = genai.GenerativeModel(settings.gemini_model)
+            self.model = await get_model(settings.gemini_model)
             self._initialized = True
     
+    async def _generate(self, prompt: str) -> str:
+        """Send a prompt to Gemini and return the response text."""
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=DIARIZATION_GENERATION_CONFIG
+        )
+        return response.text
+    
     async def diarize_audio(
         self,
         audio_path: str,
@@ -56,16 +75,22 @@ class DiarizationService:
         - Asks about rates, payments, process
         - Provides personal/financial information
         """
-        await self.initialize()
+        # A lone segment is almost always the broker's greeting/voicemail;
+        # skip the Gemini round-trip entirely
+        if len(segments) <= 1:
+            return [{**seg, 'speaker': 'user'} for seg in segments]
+        
+        if self.model is None:
+            await self.initialize()
         
         if not self.model or not segments:
             return [{**seg, 'speaker': 'unknown'} for seg in segments]
         
         # Prepare transcript for analysis
-        transcript_text = "\n".join([
-            f"[{i}]: {seg.get('text', '')}"
-            for i, seg in enumerate(segments)
-        ])
+        buf = io.StringIO()
+        for i, seg in enumerate(segments):
+            buf.write(f"[{i}]: {seg.get('text', '')[:MAX_SEGMENT_CHARS]}\n")
+        transcript_text = buf.getvalue()
         
         prompt = f"""Analyze this mortgage conversation transcript and identify which segments are spoken by the User (mortgage broker) and which by the Client.
 
@@ -91,12 +116,11 @@ Example: {{"0": "user", "1": "client", "2": "user", "3": "client"}}
 """
         
         try:
-            def _generate():
-                response = self.model.generate_content(prompt)
-                return response.text
-            
-            loop = asyncio.get_event_loop()
-            response_text = await loop.run_in_executor(None, _generate)
+            # Exact-prompt caching only: the speaker map is keyed by segment
+            # index, so it cannot be reused for a merely similar transcript
+            response_text = await llm_cache.get_or_generate(
+                settings.gemini_model, prompt, lambda: self._generate(prompt)
+            )
             
             # Parse the JSON response
             cleaned = response_text.strip()
@@ -104,7 +128,7 @@ Example: {{"0": "user", "1": "client", "2": "user", "3": "client"}}
                 cleaned = cleaned.split('\n', 1)[1]
                 cleaned = cleaned.rsplit('```', 1)[0]
             
-            speaker_map = json.loads(cleaned)
+            speaker_map = orjson.loads(cleaned)
             
             # Apply speaker labels to segments
             result = []
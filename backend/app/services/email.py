@@ -1,10 +1,16 @@
 import asyncio
+import re
+import traceback
 from typing import Optional
 import httpx
+import orjson
 from app.config import get_settings
 
 settings = get_settings()
 
+# Markdown-style **bold** markers in generated email bodies
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+
 
 class EmailService:
     """
@@ -44,7 +50,7 @@ class EmailService:
             async with httpx.AsyncClient() as client:
                 response = await client.post(
                     self.api_url,
-                    json=payload,
+                    content=orjson.dumps(payload),
                     headers={
                         "Authorization": f"Bearer {self.api_key}",
                         "Content-Type": "application/json"
@@ -56,17 +62,16 @@ class EmailService:
                 print(f"   Response body: {response.text}")
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = orjson.loads(response.content)
                     print(f"✓ Email sent successfully to {to_email} (ID: {result.get('id')})")
                     return True
                 else:
-                    error = response.json()
+                    error = orjson.loads(response.content)
                     print(f"✗ Failed to send email: {error}")
                     return False
                     
         except Exception as e:
             print(f"✗ Email sending error: {str(e)}")
-            import traceback
             traceback.print_exc()
             return False
     
@@ -230,14 +235,8 @@ The Broker Agent Team
         Returns:
             Dictionary with success status and details
         """
-        # Convert plain text body to HTML
-        import re
-        
-        # Convert **bold** to <strong>bold</strong>
-        html_body = re.sub(r'\*\*(.+?)\*\*', r'<strong style="color: #0f172a;">\1</strong>', body)
-        
-        # Convert newlines to <br>
-        html_body = html_body.replace('\n', '<br>\n')
+        # Convert plain text body to HTML: **bold** to <strong>, newlines to <br>
+        html_body = _BOLD_RE.sub(r'<strong style="color: #0f172a;">\1</strong>', body).replace('\n', '<br>\n')
         
         html_content = f"""
 <!DOCTYPE html>
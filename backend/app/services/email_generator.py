@@ -1,11 +1,39 @@
-import asyncio
-from typing import Dict, Any, Optional, List
+import re
+from dataclasses import dataclass
+from itertools import groupby
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, Any, Mapping, Optional, List, Tuple, Union
 import google.generativeai as genai
+import orjson
+from typing_extensions import TypedDict
 from app.config import get_settings
+from app.services.gemini import DETERMINISTIC_SAMPLING, get_model
+from app.services.llm_cache import llm_cache
+from app.services.summarization import summarization_service
 
 settings = get_settings()
 
 
+# Response schema enforced through Gemini's structured JSON output
+class EmailOutput(TypedDict):
+    subject: str
+    body: str
+
+
+EMAIL_GENERATION_CONFIG = genai.GenerationConfig(
+    **DETERMINISTIC_SAMPLING,
+    max_output_tokens=2048,
+    response_mime_type="application/json",
+    response_schema=EmailOutput,
+)
+
+
+# Matches a fully generated "subject" string in a partial JSON response
+_SUBJECT_RE = re.compile(r'"subject"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# Matches the generated-so-far prefix of the "body" string
+_BODY_PREFIX_RE = re.compile(r'"body"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+
 # Document requirements by loan type
 LOAN_TYPE_DOCUMENTS = {
     'conventional': {
@@ -74,10 +102,136 @@ LOAN_TYPE_DOCUMENTS = {
 }
 
 
-def get_documents_for_loan_type(loan_type: str) -> Dict[str, Any]:
-    """Get the required documents for a specific loan type."""
+# Read-only views of LOAN_TYPE_DOCUMENTS, shared by every caller
+_CACHED = {
+    loan_type: MappingProxyType({
+        'name': info['name'],
+        'documents': tuple(MappingProxyType(doc) for doc in info['documents']),
+    })
+    for loan_type, info in LOAN_TYPE_DOCUMENTS.items()
+}
+
+
+def get_documents_for_loan_type(loan_type: str) -> Mapping[str, Any]:
+    """Get the required documents for a specific loan type (read-only)."""
+    loan_type_lower = (loan_type or 'conventional').lower()
+    return _CACHED.get(loan_type_lower, _CACHED['conventional'])
+
+
+@dataclass(frozen=True, slots=True)
+class LoanDocs:
+    """Required documents for a loan type as parallel name/description/category tuples."""
+    names: Tuple[str, ...]
+    descriptions: Tuple[str, ...]
+    categories: Tuple[str, ...]
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    @classmethod
+    def from_documents(cls, documents: List[Dict[str, str]]) -> "LoanDocs":
+        """Build from a list of {'name', 'description', 'category'} dicts."""
+        return cls(
+            names=tuple(doc['name'] for doc in documents),
+            descriptions=tuple(doc.get('description', '') for doc in documents),
+            categories=tuple(doc.get('category', 'other') for doc in documents),
+        )
+
+
+LOAN_TYPE_DOCS: Dict[str, LoanDocs] = {
+    loan_type: LoanDocs.from_documents(info['documents'])
+    for loan_type, info in LOAN_TYPE_DOCUMENTS.items()
+}
+
+
+def get_loan_docs(loan_type: str) -> LoanDocs:
+    """Get the required documents for a specific loan type as a LoanDocs."""
     loan_type_lower = (loan_type or 'conventional').lower()
-    return LOAN_TYPE_DOCUMENTS.get(loan_type_lower, LOAN_TYPE_DOCUMENTS['conventional'])
+    return LOAN_TYPE_DOCS.get(loan_type_lower, LOAN_TYPE_DOCS['conventional'])
+
+
+# Display names for loan types in email prompts
+_LOAN_DISPLAY = {'conventional': 'Conventional', 'fha': 'FHA', 'va': 'VA', 'jumbo': 'Jumbo'}
+
+
+# Fixed order in which document categories are listed in emails
+DOCUMENT_CATEGORY_ORDER = ('identity', 'income', 'assets', 'credit', 'military', 'other')
+_CATEGORY_RANK = {category: rank for rank, category in enumerate(DOCUMENT_CATEGORY_ORDER)}
+
+
+def _category_sort_key(row: Tuple[str, str, str]) -> Tuple[int, str]:
+    category = row[0]
+    return _CATEGORY_RANK.get(category, len(_CATEGORY_RANK)), category
+
+
+def format_documents_text(docs: LoanDocs) -> str:
+    """Format a document list grouped by category for the email prompt."""
+    docs_text_parts = []
+    rows = sorted(zip(docs.categories, docs.names, docs.descriptions), key=_category_sort_key)
+    for category, group in groupby(rows, key=lambda row: row[0]):
+        docs_text_parts.append(f"\n{category.capitalize()} Documents:")
+        docs_text_parts.extend(f"  • {name}: {description}" for _, name, description in group)
+    return "\n".join(docs_text_parts)
+
+
+# Pre-rendered document text for the standard per-loan-type lists
+LOAN_TYPE_DOCS_TEXT = {
+    loan_type: format_documents_text(docs)
+    for loan_type, docs in LOAN_TYPE_DOCS.items()
+}
+
+
+# Static instruction prefixes. Prompts put these first and the per-client
+# details last so the shared prefix is identical across calls.
+FOLLOW_UP_EMAIL_INSTRUCTIONS = """Generate a professional, warm, and personalized follow-up email for a mortgage broker to send to a client after their initial consultation. The client's details and a summary of the conversation are at the end of this prompt.
+
+Generate an email that:
+1. Thanks the client for their time
+2. Summarizes the loan details discussed (amount, type, term)
+3. Clearly lists ALL the required documents organized by category
+4. Explains the next steps in the loan process
+5. Maintains a professional but friendly tone
+6. Is comprehensive but well-organized
+
+The document list is CRITICAL - include every document from the REQUIRED DOCUMENTS list below in the email.
+
+Respond with a JSON object containing:
+- "subject": Email subject line (mention the loan type)
+- "body": Full email body starting with "Dear <CLIENT NAME>,"
+
+Example format:
+{"subject": "Your <LOAN TYPE> Loan Application - Next Steps & Required Documents", "body": "Dear <CLIENT NAME>,\\n\\nThank you for..."}
+"""
+
+# Per-client tail of the follow-up prompt, filled with str.format_map
+FOLLOW_UP_PROMPT_TEMPLATE = """
+CLIENT NAME: {client_name}
+
+LOAN DETAILS DISCUSSED:
+{mortgage_text}
+
+REQUIRED DOCUMENTS FOR {loan_type_display} LOAN:
+{docs_text}
+
+ACTION ITEMS FROM CONVERSATION:
+{action_items_text}
+
+CONVERSATION SUMMARY (for context):
+{conversation_summary}
+"""
+
+DOCUMENT_REQUEST_EMAIL_INSTRUCTIONS = """Generate a professional email requesting documents for a mortgage application. The client's details and the documents needed are at the end of this prompt.
+
+The email should:
+1. Be friendly but professional
+2. Clearly list all required documents
+3. Explain briefly why each document type is needed
+4. Provide a reasonable timeline
+5. Offer to answer any questions
+
+Respond with a JSON object:
+{"subject": "...", "body": "..."}
+"""
 
 
 # Default email template - can be customized by Zach
@@ -112,12 +266,16 @@ class EmailGeneratorService:
         if self._initialized:
             return
         
-        if settings.gemini_api_key:
-            genai.configure(api_key=settings.gemini_api_key)
-            self.model = genai.GenerativeModel(settings.gemini_model)
-            self._initialized = True
-        else:
-            raise ValueError("Gemini API key not configured")
+        self.model = await get_model(settings.gemini_model)
+        self._initialized = True
+    
+    async def _generate(self, prompt: str) -> str:
+        """Send a prompt to Gemini and return the JSON email response text."""
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=EMAIL_GENERATION_CONFIG
+        )
+        return response.text
     
     async def generate_follow_up_email(
         self,
@@ -125,7 +283,7 @@ class EmailGeneratorService:
         transcript: str,
         mortgage_data: Dict[str, Any],
         action_items: List[Dict[str, Any]],
-        required_documents: Optional[List[Dict[str, str]]] = None,
+        required_documents: Optional[Union[LoanDocs, List[Dict[str, str]]]] = None,
         template: Optional[str] = None
     ) -> Dict[str, str]:
         """
@@ -136,116 +294,165 @@ class EmailGeneratorService:
             transcript: Conversation transcript
             mortgage_data: Extracted mortgage entities
             action_items: Extracted action items
-            required_documents: List of required documents based on loan type
+            required_documents: Required documents based on loan type, as a
+                LoanDocs or a list of document dicts
             template: Optional custom email template
         
         Returns:
             Dictionary with 'subject' and 'body' keys
         """
-        await self.initialize()
+        if self.model is None:
+            await self.initialize()
+        
+        summary = await summarization_service.summarize_transcript(transcript)
+        prompt, fallback = self._build_follow_up_prompt(
+            client_name, summary, mortgage_data, action_items, required_documents
+        )
+        
+        # Exact-prompt caching only: a near-duplicate prompt can differ in
+        # the client's name or figures, so a semantic hit would send another
+        # client's email
+        response_text = await llm_cache.get_or_generate(
+            settings.gemini_model, prompt, lambda: self._generate(prompt)
+        )
+        
+        # Parse the JSON response
+        try:
+            result = orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            result = fallback
+        
+        return result
+    
+    async def generate_follow_up_email_stream(
+        self,
+        client_name: str,
+        transcript: str,
+        mortgage_data: Dict[str, Any],
+        action_items: List[Dict[str, Any]],
+        required_documents: Optional[Union[LoanDocs, List[Dict[str, str]]]] = None
+    ) -> AsyncIterator[Dict[str, str]]:
+        """
+        Stream a follow-up email as Gemini generates it.
+        
+        Yields a partial dict with only 'subject' as soon as the subject string
+        is complete in the response, then {'body_delta': ...} dicts carrying
+        newly generated body text, and finally the full dict with 'subject'
+        and 'body' once generation finishes (the template fallback if parsing
+        fails).
+        """
+        if self.model is None:
+            await self.initialize()
+        
+        summary = await summarization_service.summarize_transcript(transcript)
+        prompt, fallback = self._build_follow_up_prompt(
+            client_name, summary, mortgage_data, action_items, required_documents
+        )
+        
+        stream = await self.model.generate_content_async(
+            prompt,
+            generation_config=EMAIL_GENERATION_CONFIG,
+            stream=True
+        )
+        
+        buffer = ""
+        subject_sent = False
+        body_sent = 0
+        async for chunk in stream:
+            buffer += chunk.text
+            if not subject_sent:
+                match = _SUBJECT_RE.search(buffer)
+                if match:
+                    subject_sent = True
+                    yield {"subject": orjson.loads(f'"{match.group(1)}"')}
+            
+            match = _BODY_PREFIX_RE.search(buffer)
+            if match:
+                try:
+                    body = orjson.loads(f'"{match.group(1)}"')
+                except orjson.JSONDecodeError:
+                    # Chunk ended inside an escape sequence; wait for the rest
+                    continue
+                if len(body) > body_sent:
+                    yield {"body_delta": body[body_sent:]}
+                    body_sent = len(body)
+        
+        try:
+            result = orjson.loads(buffer)
+        except orjson.JSONDecodeError:
+            result = fallback
         
+        yield result
+    
+    def _build_follow_up_prompt(
+        self,
+        client_name: str,
+        conversation_summary: str,
+        mortgage_data: Dict[str, Any],
+        action_items: List[Dict[str, Any]],
+        required_documents: Optional[Union[LoanDocs, List[Dict[str, str]]]] = None
+    ) -> Tuple[str, Dict[str, str]]:
+        """Build the follow-up email prompt and the template fallback email."""
         # Format action items for the prompt
         action_items_text = "\n".join([
             f"- {item.get('description', '')} (Assignee: {item.get('assignee', 'TBD')})"
             for item in action_items
         ])
         
-        # Format mortgage data
-        mortgage_summary = []
-        loan_type = mortgage_data.get('loan_type', 'conventional')
-        loan_type_display = loan_type.upper() if loan_type in ['fha', 'va'] else loan_type.capitalize()
-        
-        if mortgage_data.get('loan_amount'):
-            mortgage_summary.append(f"Loan Amount: ${mortgage_data['loan_amount']:,.0f}")
-        if loan_type:
-            mortgage_summary.append(f"Loan Type: {loan_type_display}")
-        if mortgage_data.get('loan_term_years'):
-            mortgage_summary.append(f"Loan Term: {mortgage_data['loan_term_years']} years")
-        if mortgage_data.get('interest_rate'):
-            mortgage_summary.append(f"Interest Rate: {mortgage_data['interest_rate']}%")
+        # Format mortgage data as (label, value) pairs, skipping missing values
+        loan_type = mortgage_data.get('loan_type') or 'conventional'
+        loan_type_display = _LOAN_DISPLAY.get(loan_type) or loan_type.capitalize()
+        loan_amount = mortgage_data.get('loan_amount')
+        loan_term_years = mortgage_data.get('loan_term_years')
+        interest_rate = mortgage_data.get('interest_rate')
         
-        mortgage_text = "\n".join(mortgage_summary) if mortgage_summary else "To be determined based on your application"
+        mortgage_summary = (
+            ("Loan Amount", f"${loan_amount:,.0f}" if loan_amount else None),
+            ("Loan Type", loan_type_display),
+            ("Loan Term", f"{loan_term_years} years" if loan_term_years else None),
+            ("Interest Rate", f"{interest_rate}%" if interest_rate else None),
+        )
+        mortgage_text = "\n".join(
+            f"{label}: {value}" for label, value in mortgage_summary if value
+        ) or "To be determined based on your application"
         
-        # Format required documents
-        if required_documents:
-            docs_by_category = {}
-            for doc in required_documents:
-                category = doc.get('category', 'other').capitalize()
-                if category not in docs_by_category:
-                    docs_by_category[category] = []
-                docs_by_category[category].append(f"  • {doc['name']}: {doc.get('description', '')}")
-            
-            docs_text_parts = []
-            for category, docs in docs_by_category.items():
-                docs_text_parts.append(f"\n{category} Documents:")
-                docs_text_parts.extend(docs)
-            docs_text = "\n".join(docs_text_parts)
-        else:
+        # Format required documents, reusing the pre-rendered text when the
+        # caller passed one of the standard LOAN_TYPE_DOCS entries (keyed in
+        # lowercase, as get_loan_docs looks them up)
+        loan_type_key = loan_type.lower()
+        if not required_documents:
             docs_text = "Standard documentation will be required."
+        elif required_documents is LOAN_TYPE_DOCS.get(loan_type_key):
+            docs_text = LOAN_TYPE_DOCS_TEXT[loan_type_key]
+        else:
+            if not isinstance(required_documents, LoanDocs):
+                required_documents = LoanDocs.from_documents(required_documents)
+            docs_text = format_documents_text(required_documents)
         
-        prompt = f"""Generate a professional, warm, and personalized follow-up email for a mortgage broker to send to a client after their initial consultation.
-
-CLIENT NAME: {client_name}
-
-CONVERSATION TRANSCRIPT (for context):
-{transcript[:2000]}
-
-LOAN DETAILS DISCUSSED:
-{mortgage_text}
-
-REQUIRED DOCUMENTS FOR {loan_type_display} LOAN:
-{docs_text}
-
-ACTION ITEMS FROM CONVERSATION:
-{action_items_text or "No specific action items identified"}
-
-Generate an email that:
-1. Thanks the client for their time
-2. Summarizes the loan details discussed (amount, type, term)
-3. Clearly lists ALL the required documents organized by category
-4. Explains the next steps in the loan process
-5. Maintains a professional but friendly tone
-6. Is comprehensive but well-organized
-
-The document list is CRITICAL - include every document from the list above in the email.
-
-Respond with a JSON object containing:
-- "subject": Email subject line (mention the loan type)
-- "body": Full email body starting with "Dear {client_name},"
-
-Example format:
-{{"subject": "Your {loan_type_display} Loan Application - Next Steps & Required Documents", "body": "Dear {client_name},\\n\\nThank you for..."}}
-"""
-        
-        def _generate():
-            response = self.model.generate_content(prompt)
-            return response.text
+        prompt = "".join((
+            FOLLOW_UP_EMAIL_INSTRUCTIONS,
+            FOLLOW_UP_PROMPT_TEMPLATE.format_map({
+                "client_name": client_name,
+                "mortgage_text": mortgage_text,
+                "loan_type_display": loan_type_display,
+                "docs_text": docs_text,
+                "action_items_text": action_items_text or "No specific action items identified",
+                "conversation_summary": conversation_summary,
+            }),
+        ))
         
-        loop = asyncio.get_event_loop()
-        response_text = await loop.run_in_executor(None, _generate)
+        # Fallback to basic template if AI fails
+        fallback = {
+            "subject": f"Following Up on Our Mortgage Conversation - {client_name}",
+            "body": DEFAULT_FOLLOW_UP_TEMPLATE.format(
+                client_name=client_name,
+                conversation_summary=mortgage_text,
+                action_items_section=action_items_text or "We'll discuss next steps soon.",
+                next_steps="I'll be in touch shortly with more information."
+            )
+        }
         
-        # Parse the JSON response
-        try:
-            import json
-            cleaned = response_text.strip()
-            if cleaned.startswith('```'):
-                cleaned = cleaned.split('\n', 1)[1]
-                cleaned = cleaned.rsplit('```', 1)[0]
-            
-            result = json.loads(cleaned)
-        except Exception:
-            # Fallback to basic template if AI fails
-            result = {
-                "subject": f"Following Up on Our Mortgage Conversation - {client_name}",
-                "body": DEFAULT_FOLLOW_UP_TEMPLATE.format(
-                    client_name=client_name,
-                    conversation_summary=mortgage_text,
-                    action_items_section=action_items_text or "We'll discuss next steps soon.",
-                    next_steps="I'll be in touch shortly with more information."
-                )
-            }
-        
-        return result
+        return prompt, fallback
     
     async def generate_document_request_email(
         self,
@@ -264,48 +471,29 @@ Example format:
         Returns:
             Dictionary with 'subject' and 'body' keys
         """
-        await self.initialize()
+        if self.model is None:
+            await self.initialize()
         
         docs_list = "\n".join([
             f"- {doc.get('name', 'Document')}: {doc.get('description', '')}"
             for doc in required_documents
         ])
         
-        prompt = f"""Generate a professional email requesting documents for a mortgage application.
-
+        prompt = f"""{DOCUMENT_REQUEST_EMAIL_INSTRUCTIONS}
 CLIENT NAME: {client_name}
 LOAN TYPE: {loan_type or 'Mortgage'}
 
 DOCUMENTS NEEDED:
 {docs_list}
-
-The email should:
-1. Be friendly but professional
-2. Clearly list all required documents
-3. Explain briefly why each document type is needed
-4. Provide a reasonable timeline
-5. Offer to answer any questions
-
-Respond with a JSON object:
-{{"subject": "...", "body": "..."}}
 """
         
-        def _generate():
-            response = self.model.generate_content(prompt)
-            return response.text
-        
-        loop = asyncio.get_event_loop()
-        response_text = await loop.run_in_executor(None, _generate)
+        response_text = await llm_cache.get_or_generate(
+            settings.gemini_model, prompt, lambda: self._generate(prompt)
+        )
         
         try:
-            import json
-            cleaned = response_text.strip()
-            if cleaned.startswith('```'):
-                cleaned = cleaned.split('\n', 1)[1]
-                cleaned = cleaned.rsplit('```', 1)[0]
-            
-            result = json.loads(cleaned)
-        except Exception:
+            result = orjson.loads(response_text)
+        except orjson.JSONDecodeError:
             result = {
                 "subject": f"Documents Needed for Your {loan_type or 'Mortgage'} Application",
                 "body": f"Dear {client_name},\n\nTo proceed with your mortgage application, we'll need the following documents:\n\n{docs_list}\n\nPlease let me know if you have any questions.\n\nBest regards,\nZach"
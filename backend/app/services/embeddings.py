@@ -0,0 +1,30 @@
+import asyncio
+from functools import lru_cache
+from typing import List
+import numpy as np
+from app.config import get_settings
+
+settings = get_settings()
+
+
+@lru_cache()
+def get_embedder():
+    """Load the local sentence-transformer once and share it process-wide."""
+    # Imported lazily: only needed when the semantic cache is enabled
+    from sentence_transformers import SentenceTransformer
+    
+    return SentenceTransformer(settings.embedding_model, device="cpu")
+
+
+async def embed(text: str) -> np.ndarray:
+    """Embed a single text into a normalized float32 vector."""
+    return await asyncio.to_thread(
+        get_embedder().encode, text, normalize_embeddings=True
+    )
+
+
+async def embed_batch(texts: List[str]) -> np.ndarray:
+    """Embed several texts in one vectorized encode call."""
+    return await asyncio.to_thread(
+        get_embedder().encode, texts, normalize_embeddings=True
+    )
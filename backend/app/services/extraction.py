@@ -1,12 +1,231 @@
 import asyncio
-import json
-from typing import Dict, Any, List, Optional
+import re
+from typing import Dict, Any, List, Literal, Optional
 import google.generativeai as genai
+from typing_extensions import TypedDict
+import orjson
 from app.config import get_settings
+from app.services.gemini import DETERMINISTIC_SAMPLING, get_model
+from app.services.llm_cache import llm_cache
+from app.services.summarization import summarization_service
 
 settings = get_settings()
 
 
+# Response schemas enforced through Gemini's structured JSON output. genai
+# converts them with pydantic, which needs typing_extensions.TypedDict before
+# Python 3.12
+class MortgageEntities(TypedDict):
+    loan_amount: Optional[float]
+    loan_term_years: Optional[int]
+    loan_type: Optional[str]
+
+
+class FullMortgageEntities(MortgageEntities):
+    interest_rate: Optional[float]
+    property_type: Optional[str]
+    property_address: Optional[str]
+    purchase_price: Optional[float]
+    down_payment: Optional[float]
+    down_payment_percentage: Optional[float]
+    borrower_income: Optional[float]
+    borrower_employment: Optional[str]
+    credit_score_range: Optional[str]
+
+
+class ExtractedActionItem(TypedDict):
+    description: str
+    category: str
+    assignee: str
+    priority: str
+    context: str
+
+
+class ExtractionOutput(TypedDict):
+    entities: MortgageEntities
+    action_items: List[ExtractedActionItem]
+
+
+class FullExtractionOutput(TypedDict):
+    entities: FullMortgageEntities
+    action_items: List[ExtractedActionItem]
+
+
+# "minimal" extracts the three loan fields the pipeline stores; "full" also
+# extracts the property and borrower fields of MortgageExtraction
+ExtractionProfile = Literal["minimal", "full"]
+
+
+# Output token caps; action item lists get more room so long calls do not
+# truncate the JSON array
+EXTRACTION_MAX_OUTPUT_TOKENS = 1024
+ACTION_ITEM_MAX_OUTPUT_TOKENS = 2048
+
+ENTITY_GENERATION_CONFIG = genai.GenerationConfig(
+    **DETERMINISTIC_SAMPLING,
+    max_output_tokens=EXTRACTION_MAX_OUTPUT_TOKENS,
+    response_mime_type="application/json",
+    response_schema=MortgageEntities,
+)
+
+ACTION_ITEM_GENERATION_CONFIG = genai.GenerationConfig(
+    **DETERMINISTIC_SAMPLING,
+    max_output_tokens=ACTION_ITEM_MAX_OUTPUT_TOKENS,
+    response_mime_type="application/json",
+    # genai only recognizes the builtin list as an array schema
+    response_schema=list[ExtractedActionItem],
+)
+
+COMBINED_GENERATION_CONFIG = genai.GenerationConfig(
+    **DETERMINISTIC_SAMPLING,
+    max_output_tokens=ACTION_ITEM_MAX_OUTPUT_TOKENS,
+    response_mime_type="application/json",
+    response_schema=ExtractionOutput,
+)
+
+FULL_ENTITY_GENERATION_CONFIG = genai.GenerationConfig(
+    **DETERMINISTIC_SAMPLING,
+    max_output_tokens=EXTRACTION_MAX_OUTPUT_TOKENS,
+    response_mime_type="application/json",
+    response_schema=FullMortgageEntities,
+)
+
+FULL_COMBINED_GENERATION_CONFIG = genai.GenerationConfig(
+    **DETERMINISTIC_SAMPLING,
+    max_output_tokens=ACTION_ITEM_MAX_OUTPUT_TOKENS,
+    response_mime_type="application/json",
+    response_schema=FullExtractionOutput,
+)
+
+
+# Sentences stating an exact figure, loan type, document request or deadline
+# are kept verbatim next to the summary so those details survive condensing.
+# Kept narrow on purpose: matching every number or common verb would keep
+# most of the call.
+RELEVANT_TURN_RE = re.compile(
+    r"\$\s?\d|\d\s?(?:%|percent\b)|\b\d[\d,.]*\s?(?:k|thousand|million)\b"
+    r"|\b\d{2}[- ]year|\bcredit score|\bfha\b|\bva\b|\bjumbo\b|\bconventional\b"
+    r"|\bpay ?stubs?\b|\bw-?2s?\b|\b(?:bank|tax) (?:statements?|returns?)\b"
+    r"|\bby (?:mon|tues|wednes|thurs|fri|satur|sun)day\b|\bby (?:tomorrow|next week|the end of)\b",
+    re.IGNORECASE,
+)
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+# The condensed prompt is only used when it is at most this fraction of the
+# transcript; otherwise the raw transcript is cheaper and loses nothing
+CONDENSED_MAX_RATIO = 0.5
+
+
+# Static instruction prefixes. Prompts put these first and the transcript
+# last so the shared prefix is identical across calls (prefix-cache friendly).
+ENTITY_FIELDS = """1. loan_amount: The dollar amount being requested for the loan (as a number, e.g., 450000)
+2. loan_term_years: The loan term in years (typically 15, 20, or 30)
+3. loan_type: The type of loan - MUST be one of: "conventional", "FHA", "VA", or "jumbo" (lowercase)"""
+
+FULL_ENTITY_FIELDS = f"""{ENTITY_FIELDS}
+4. interest_rate: The interest rate discussed, as a percentage number (e.g., 6.75)
+5. property_type: The property type (e.g., "single_family", "condo", "townhouse", "multi_family")
+6. property_address: The property address, if mentioned
+7. purchase_price: The purchase price of the property (as a number)
+8. down_payment: The down payment amount (as a number)
+9. down_payment_percentage: The down payment as a percentage of the purchase price (as a number)
+10. borrower_income: The borrower's annual income (as a number)
+11. borrower_employment: The borrower's employer or employment type
+12. credit_score_range: The borrower's credit score or range (e.g., "720-740")"""
+
+ACTION_ITEM_FIELDS = """1. description: What needs to be done
+2. category: One of [document_request, follow_up, commitment, information_needed, deadline, other]
+3. assignee: Who is responsible - "broker" (Zach) or "client"
+4. priority: "high", "medium", or "low"
+5. context: Brief context from the conversation
+
+Common document requests in mortgage include:
+- Pay stubs, W-2s, tax returns
+- Bank statements
+- ID/driver's license
+- Employment verification
+- Gift letters
+- Proof of assets"""
+
+ENTITY_EXAMPLE = '{"loan_amount": 450000, "loan_term_years": 30, "loan_type": "conventional"}'
+
+FULL_ENTITY_EXAMPLE = (
+    '{"loan_amount": 450000, "loan_term_years": 30, "loan_type": "conventional", '
+    '"interest_rate": 6.75, "property_type": "single_family", "property_address": null, '
+    '"purchase_price": 562500, "down_payment": 112500, "down_payment_percentage": 20, '
+    '"borrower_income": 150000, "borrower_employment": "Software engineer at Acme", '
+    '"credit_score_range": "740-760"}'
+)
+
+ACTION_ITEMS_EXAMPLE = """[
+  {"description": "Provide last 2 years of tax returns", "category": "document_request", "assignee": "client", "priority": "high", "context": "Needed for income verification"},
+  {"description": "Send rate lock options by Friday", "category": "commitment", "assignee": "broker", "priority": "high", "context": "Client wants to lock in current rate"}
+]"""
+
+def _entity_instructions(fields: str, example: str) -> str:
+    return f"""Analyze the mortgage broker-client conversation transcript at the end of this prompt and extract the loan details.
+
+Extract ONLY the following loan details (return null if not found):
+
+{fields}
+
+Respond ONLY with a valid JSON object. Do not include markdown formatting or code blocks.
+Example format:
+{example}
+"""
+
+
+ACTION_ITEM_EXTRACTION_INSTRUCTIONS = f"""Analyze the mortgage broker-client conversation transcript at the end of this prompt and extract all action items, commitments, and next steps.
+
+For each action item, identify:
+{ACTION_ITEM_FIELDS}
+
+Respond ONLY with a valid JSON array. Do not include markdown formatting.
+Example format:
+{ACTION_ITEMS_EXAMPLE}
+"""
+
+
+def _combined_instructions(fields: str, example: str) -> str:
+    return f"""Analyze the mortgage broker-client conversation transcript at the end of this prompt and extract both the loan details and all action items, commitments, and next steps.
+
+Respond with a single JSON object with exactly two keys:
+- "entities": an object with the loan details
+- "action_items": an array of action items
+
+For "entities", extract ONLY the following loan details (return null if not found):
+
+{fields}
+
+For each entry in "action_items", identify:
+{ACTION_ITEM_FIELDS}
+
+Example format:
+{{"entities": {example}, "action_items": {ACTION_ITEMS_EXAMPLE}}}
+"""
+
+
+ENTITY_EXTRACTION_INSTRUCTIONS = _entity_instructions(ENTITY_FIELDS, ENTITY_EXAMPLE)
+COMBINED_EXTRACTION_INSTRUCTIONS = _combined_instructions(ENTITY_FIELDS, ENTITY_EXAMPLE)
+
+# Prompt instructions and generation config per extraction profile
+ENTITY_PROFILES = {
+    "minimal": (ENTITY_EXTRACTION_INSTRUCTIONS, ENTITY_GENERATION_CONFIG),
+    "full": (
+        _entity_instructions(FULL_ENTITY_FIELDS, FULL_ENTITY_EXAMPLE),
+        FULL_ENTITY_GENERATION_CONFIG
+    ),
+}
+
+COMBINED_PROFILES = {
+    "minimal": (COMBINED_EXTRACTION_INSTRUCTIONS, COMBINED_GENERATION_CONFIG),
+    "full": (
+        _combined_instructions(FULL_ENTITY_FIELDS, FULL_ENTITY_EXAMPLE),
+        FULL_COMBINED_GENERATION_CONFIG
+    ),
+}
+
+
 class ExtractionService:
     """Service for extracting mortgage entities and action items using Gemini AI."""
     
@@ -19,61 +238,80 @@ class ExtractionService:
         if self._initialized:
             return
         
-        if settings.gemini_api_key:
-            genai.configure(api_key=settings.gemini_api_key)
-            self.model = genai.GenerativeModel(settings.gemini_model)
-            self._initialized = True
-        else:
-            raise ValueError("Gemini API key not configured")
+        self.model = await get_model(settings.gemini_model)
+        self._initialized = True
+    
+    async def _generate(
+        self,
+        prompt: str,
+        generation_config: Optional[genai.GenerationConfig] = None
+    ) -> str:
+        """Send a prompt to Gemini and return the response text."""
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=generation_config
+        )
+        return response.text
+    
+    async def _condense_transcript(self, transcript: str) -> str:
+        """
+        Replace a long transcript with its summary plus the relevant turns.
+        
+        The summary is the same cached one the follow-up email uses, so a
+        conversation is summarized only once. Transcripts too short to
+        summarize, transcripts the condensed form would not clearly shrink,
+        and every transcript in audit mode are returned unchanged.
+        """
+        if settings.extraction_audit_mode:
+            return transcript
+        
+        summary = await summarization_service.summarize_transcript(transcript)
+        if summary is transcript:
+            return transcript
+        
+        sentences = SENTENCE_SPLIT_RE.split(transcript)
+        excerpts = "\n".join(
+            sentence for sentence in sentences if RELEVANT_TURN_RE.search(sentence)
+        )
+        
+        condensed = f"SUMMARY:\n{summary}\n\nRELEVANT EXCERPTS (verbatim):\n{excerpts}"
+        if len(condensed) > len(transcript) * CONDENSED_MAX_RATIO:
+            return transcript
+        return condensed
     
     async def extract_mortgage_entities(
         self,
-        transcript: str
+        transcript: str,
+        profile: ExtractionProfile = "minimal"
     ) -> Dict[str, Any]:
         """
         Extract mortgage-related entities from a conversation transcript.
         
         Args:
             transcript: The conversation transcript text
+            profile: "minimal" for the three loan fields, "full" for every
+                MortgageExtraction field
         
         Returns:
             Dictionary containing extracted mortgage information
         """
-        await self.initialize()
-        
-        prompt = f"""Analyze this mortgage broker-client conversation transcript and extract the loan details.
-
-TRANSCRIPT:
-{transcript}
-
-Extract ONLY the following loan details (return null if not found):
-
-1. loan_amount: The dollar amount being requested for the loan (as a number, e.g., 450000)
-2. loan_term_years: The loan term in years (typically 15, 20, or 30)
-3. loan_type: The type of loan - MUST be one of: "conventional", "FHA", "VA", or "jumbo" (lowercase)
-
-Respond ONLY with a valid JSON object. Do not include markdown formatting or code blocks.
-Example format:
-{{"loan_amount": 450000, "loan_term_years": 30, "loan_type": "conventional"}}
-"""
+        if self.model is None:
+            await self.initialize()
         
-        def _generate():
-            response = self.model.generate_content(prompt)
-            return response.text
+        transcript = await self._condense_transcript(transcript)
+        instructions, generation_config = ENTITY_PROFILES[profile]
+        prompt = f"{instructions}\nTRANSCRIPT:\n{transcript}\n"
         
-        loop = asyncio.get_event_loop()
-        response_text = await loop.run_in_executor(None, _generate)
+        response_text = await llm_cache.get_or_generate(
+            settings.gemini_model,
+            prompt,
+            lambda: self._generate(prompt, generation_config)
+        )
         
         # Parse the JSON response
         try:
-            # Clean up response if needed
-            cleaned = response_text.strip()
-            if cleaned.startswith('```'):
-                cleaned = cleaned.split('\n', 1)[1]
-                cleaned = cleaned.rsplit('```', 1)[0]
-            
-            result = json.loads(cleaned)
-        except json.JSONDecodeError:
+            result = orjson.loads(response_text)
+        except orjson.JSONDecodeError:
             result = {"raw_response": response_text, "parse_error": True}
         
         return result
@@ -91,79 +329,147 @@ Example format:
         Returns:
             List of action items with details
         """
-        await self.initialize()
+        if self.model is None:
+            await self.initialize()
         
-        prompt = f"""Analyze this mortgage broker-client conversation and extract all action items, commitments, and next steps.
-
-TRANSCRIPT:
-{transcript}
-
-For each action item, identify:
-1. description: What needs to be done
-2. category: One of [document_request, follow_up, commitment, information_needed, deadline, other]
-3. assignee: Who is responsible - "broker" (Zach) or "client"
-4. priority: "high", "medium", or "low"
-5. context: Brief context from the conversation
-
-Common document requests in mortgage include:
-- Pay stubs, W-2s, tax returns
-- Bank statements
-- ID/driver's license
-- Employment verification
-- Gift letters
-- Proof of assets
-
-Respond ONLY with a valid JSON array. Do not include markdown formatting.
-Example format:
-[
-  {{"description": "Provide last 2 years of tax returns", "category": "document_request", "assignee": "client", "priority": "high", "context": "Needed for income verification"}},
-  {{"description": "Send rate lock options by Friday", "category": "commitment", "assignee": "broker", "priority": "high", "context": "Client wants to lock in current rate"}}
-]
-"""
+        transcript = await self._condense_transcript(transcript)
+        prompt = f"{ACTION_ITEM_EXTRACTION_INSTRUCTIONS}\nTRANSCRIPT:\n{transcript}\n"
         
-        def _generate():
-            response = self.model.generate_content(prompt)
-            return response.text
-        
-        loop = asyncio.get_event_loop()
-        response_text = await loop.run_in_executor(None, _generate)
+        response_text = await llm_cache.get_or_generate(
+            settings.gemini_model,
+            prompt,
+            lambda: self._generate(prompt, ACTION_ITEM_GENERATION_CONFIG)
+        )
         
         # Parse the JSON response
         try:
-            cleaned = response_text.strip()
-            if cleaned.startswith('```'):
-                cleaned = cleaned.split('\n', 1)[1]
-                cleaned = cleaned.rsplit('```', 1)[0]
-            
-            result = json.loads(cleaned)
-        except json.JSONDecodeError:
+            result = orjson.loads(response_text)
+        except orjson.JSONDecodeError:
             result = [{"description": "Error parsing response", "raw_response": response_text}]
         
         return result
     
+    async def extract_all(
+        self,
+        transcript: str,
+        profile: ExtractionProfile = "minimal"
+    ) -> Dict[str, Any]:
+        """
+        Extract mortgage entities and action items with a single Gemini call.
+        
+        The transcript is sent once and Gemini returns schema-conforming
+        JSON, so there is no second prefill of the same transcript.
+        
+        Args:
+            transcript: The conversation transcript text
+            profile: "minimal" for the three loan fields, "full" for every
+                MortgageExtraction field
+        
+        Returns:
+            Dictionary with 'entities' and 'action_items' keys
+        """
+        if self.model is None:
+            await self.initialize()
+        
+        transcript = await self._condense_transcript(transcript)
+        instructions, generation_config = COMBINED_PROFILES[profile]
+        prompt = f"{instructions}\nTRANSCRIPT:\n{transcript}\n"
+        
+        response_text = await llm_cache.get_or_generate(
+            settings.gemini_model,
+            prompt,
+            lambda: self._generate(prompt, generation_config)
+        )
+        
+        try:
+            result = orjson.loads(response_text)
+            entities = result.get("entities") or {}
+            action_items = result.get("action_items") or []
+        except (orjson.JSONDecodeError, AttributeError):
+            entities = {"raw_response": response_text, "parse_error": True}
+            action_items = [{"description": "Error parsing response", "raw_response": response_text}]
+        
+        return {
+            "entities": entities,
+            "action_items": action_items
+        }
+    
     async def process_transcript(
         self,
-        transcript: str
+        transcript: str,
+        profile: ExtractionProfile = "minimal"
     ) -> Dict[str, Any]:
         """
         Process a transcript to extract both mortgage entities and action items.
         
         Args:
             transcript: The conversation transcript text
+            profile: Entity extraction profile ("minimal" or "full")
         
         Returns:
             Dictionary containing mortgage_extraction and action_items
         """
-        # Run both extractions in parallel
-        entities_task = self.extract_mortgage_entities(transcript)
-        actions_task = self.extract_action_items(transcript)
-        
-        entities, actions = await asyncio.gather(entities_task, actions_task)
+        result = await self.extract_all(transcript, profile)
         
         return {
-            "mortgage_extraction": entities,
-            "action_items": actions
+            "mortgage_extraction": result["entities"],
+            "action_items": result["action_items"]
         }
+    
+    async def process_many(
+        self,
+        transcripts: List[str],
+        concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Process a batch of transcripts with bounded concurrency.
+        
+        Transcripts are fed through a queue to a fixed pool of workers, so only
+        `concurrency` extractions (and coroutines) are in flight at any time,
+        however large the batch.
+        
+        Args:
+            transcripts: Conversation transcript texts
+            concurrency: Maximum concurrent extractions; defaults to, and is
+                capped at, the extraction_batch_concurrency setting
+        
+        Returns:
+            One process_transcript result per transcript, in input order; a
+            transcript that fails yields a result with an "error" key instead
+        """
+        if not transcripts:
+            return []
+        
+        if self.model is None:
+            await self.initialize()
+        
+        concurrency = min(
+            concurrency or settings.extraction_batch_concurrency,
+            settings.extraction_batch_concurrency
+        )
+        results: List[Optional[Dict[str, Any]]] = [None] * len(transcripts)
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in enumerate(transcripts):
+            queue.put_nowait(item)
+        
+        async def worker():
+            while True:
+                try:
+                    index, transcript = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    results[index] = await self.process_transcript(transcript)
+                except Exception as e:
+                    print(f"Batch extraction error (transcript {index}): {e}")
+                    results[index] = {
+                        "mortgage_extraction": {},
+                        "action_items": [],
+                        "error": str(e)
+                    }
+        
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(transcripts)))))
+        return results
 
 
 # Singleton instance
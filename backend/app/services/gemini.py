@@ -0,0 +1,37 @@
+import asyncio
+from typing import Dict
+import google.generativeai as genai
+from app.config import get_settings
+
+settings = get_settings()
+
+# Process-wide GenerativeModel instances, keyed by model name
+_models: Dict[str, genai.GenerativeModel] = {}
+_lock = asyncio.Lock()
+
+# Greedy single-candidate sampling: shorter, reproducible structured output
+DETERMINISTIC_SAMPLING = {"temperature": 0.0, "top_p": 1.0, "candidate_count": 1}
+
+
+async def get_model(name: str) -> genai.GenerativeModel:
+    """
+    Get the shared GenerativeModel for a model name.
+    
+    genai.configure is global, so it runs once on the first call and every
+    service reuses the same model object afterwards. Its async client already
+    runs on genai's default grpc_asyncio transport, a single multiplexed
+    channel, so there is no connection pool to size.
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+    
+    async with _lock:
+        if name not in _models:
+            if not settings.gemini_api_key:
+                raise ValueError("Gemini API key not configured")
+            if not _models:
+                genai.configure(api_key=settings.gemini_api_key)
+            _models[name] = genai.GenerativeModel(name)
+    
+    return _models[name]
@@ -1,15 +1,82 @@
 import os
 import asyncio
-from typing import Optional, List, Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import httpx
+from google.auth.transport.requests import Request
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-import io
-import aiofiles
 from app.config import get_settings
 
 settings = get_settings()
 
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+
+FILE_METADATA_FIELDS = 'id, name, createdTime, modifiedTime, size, mimeType'
+
+CHANGES_FIELDS = (
+    'nextPageToken, newStartPageToken, '
+    'changes(fileId, removed, file(id, name, mimeType, parents, trashed, '
+    'createdTime, modifiedTime, size))'
+)
+
+# Maximum calls per Drive batch request
+METADATA_BATCH_SIZE = 100
+
+# Seconds a folder listing is reused before Drive is queried again
+LIST_CACHE_TTL = 30.0
+
+# Drive calls block on the network, not the CPU, so the pool is sized well
+# above the core count
+DRIVE_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 5)
+
+# Bytes read from the media stream per write to disk
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Files smaller than this are downloaded over a single stream
+PARALLEL_DOWNLOAD_MIN_SIZE = 16 * 1024 * 1024
+# Size of each byte range fetched by parallel downloads
+PARALLEL_RANGE_SIZE = 8 * 1024 * 1024
+
+# The access token is renewed this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300.0
+# Delay before retrying a failed background token refresh
+TOKEN_REFRESH_RETRY = 30.0
+
+
+def _open_for_download(path: str, size: Optional[int]) -> int:
+    """Create (or truncate) a download destination and preallocate size bytes."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    if size:
+        try:
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except (AttributeError, OSError):
+                os.ftruncate(fd, size)  # Not supported on this platform/filesystem
+        except BaseException:
+            os.close(fd)
+            raise
+    return fd
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int) -> None:
+    """Write all of data at offset, looping over short writes."""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def _discard_download(fd: int, path: str) -> None:
+    """Close and delete a partially written download."""
+    os.close(fd)
+    if os.path.exists(path):
+        os.remove(path)
+
 
 class GoogleDriveService:
     """Service for interacting with Google Drive API."""
@@ -19,87 +86,478 @@ class GoogleDriveService:
     def __init__(self):
         self.credentials = None
         self.service = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+        # Drive changes feed position; set when a push channel is registered
+        self.changes_page_token: Optional[str] = None
+        # Active push channel (id, resourceId), stopped when replaced
+        self.watch_channel: Optional[Dict[str, Any]] = None
+        self._changes_lock = asyncio.Lock()
+        # folder_id -> (monotonic fetch time, files)
+        self._list_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._init_lock = asyncio.Lock()
         self._initialized = False
+        # Dedicated pool so blocking Drive calls never queue behind (or
+        # starve) other work on the default executor
+        self._pool = ThreadPoolExecutor(
+            max_workers=DRIVE_MAX_WORKERS,
+            thread_name_prefix="gdrive",
+        )
     
     async def initialize(self):
         """Initialize Google Drive service with credentials."""
         if self._initialized:
             return
         
-        credentials_path = settings.google_drive_credentials_path
-        
-        if os.path.exists(credentials_path):
+        # Initialization awaits a token refresh, so concurrent first callers
+        # must not each build clients and start their own refresher
+        async with self._init_lock:
+            if self._initialized:
+                return
+            
+            credentials_path = settings.google_drive_credentials_path
+            
+            if not os.path.exists(credentials_path):
+                raise FileNotFoundError(f"Google Drive credentials not found at {credentials_path}")
+            
             self.credentials = service_account.Credentials.from_service_account_file(
                 credentials_path,
                 scopes=self.SCOPES
             )
+            # Mint the first access token now and keep it renewed in the
+            # background, so no request has to sign a JWT and wait for it
+            await self._run_blocking(self.credentials.refresh, Request())
             self.service = build('drive', 'v3', credentials=self.credentials)
+            # Media downloads bypass googleapiclient: one pooled HTTP/2
+            # connection streams each file in a single GET
+            self.http_client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(http2=True, retries=3),
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+                timeout=httpx.Timeout(30.0, read=300.0),
+            )
+            self._refresh_task = asyncio.create_task(self._refresher())
             self._initialized = True
-        else:
-            raise FileNotFoundError(f"Google Drive credentials not found at {credentials_path}")
+    
+    async def close(self):
+        """Stop the token refresher and close the pooled HTTP client."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+        self._initialized = False
+    
+    async def _refresher(self):
+        """Refresh the access token TOKEN_REFRESH_MARGIN seconds before it expires."""
+        while True:
+            # google-auth reports expiry as a naive UTC datetime
+            expiry = self.credentials.expiry
+            delay = (
+                (expiry - datetime.utcnow()).total_seconds() - TOKEN_REFRESH_MARGIN
+                if expiry else 0.0
+            )
+            await asyncio.sleep(max(delay, TOKEN_REFRESH_RETRY))
+            try:
+                await self._run_blocking(self.credentials.refresh, Request())
+            except Exception as e:
+                # _auth_headers still refreshes on demand if this keeps failing
+                print(f"Google Drive token refresh failed: {e}")
+    
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking Drive call on the Drive thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, func, *args)
+    
+    async def _auth_headers(self) -> Dict[str, str]:
+        """Return an Authorization header, refreshing the access token if needed."""
+        if not self.credentials.valid:
+            await self._run_blocking(self.credentials.refresh, Request())
+        return {"Authorization": f"Bearer {self.credentials.token}"}
+    
+    def _invalidate_list_cache(self, file_id: Optional[str] = None):
+        """
+        Drop cached folder listings.
+        
+        With a file_id, listings are only dropped when none of them contains
+        that file (i.e. it is new since they were fetched).
+        """
+        if file_id is not None and any(
+            file['id'] == file_id
+            for _, files in self._list_cache.values()
+            for file in files
+        ):
+            return
+        self._list_cache.clear()
     
     async def list_mp3_files(self, folder_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """List all MP3 files in a specific folder or the configured folder."""
+        """
+        List all MP3 files in a specific folder or the configured folder.
+        
+        Listings are cached per folder for LIST_CACHE_TTL seconds, so repeated
+        calls do not re-query Drive.
+        """
         await self.initialize()
         
         folder_id = folder_id or settings.google_drive_folder_id
         
+        cached = self._list_cache.get(folder_id)
+        if cached is not None and time.monotonic() - cached[0] < LIST_CACHE_TTL:
+            return list(cached[1])
+        
         query = f"'{folder_id}' in parents and mimeType='audio/mpeg' and trashed=false"
         
         def _list_files():
-            results = self.service.files().list(
-                q=query,
-                spaces='drive',
-                fields='files(id, name, createdTime, modifiedTime, size)',
-                orderBy='modifiedTime desc'
+            files = []
+            page_token = None
+            while True:
+                results = self.service.files().list(
+                    q=query,
+                    spaces='drive',
+                    corpora='user',
+                    pageSize=1000,
+                    pageToken=page_token,
+                    fields='nextPageToken, files(id, name, createdTime, modifiedTime, size)',
+                    orderBy='modifiedTime desc'
+                ).execute()
+                files.extend(results.get('files', []))
+                
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    return files
+        
+        fetched_at = time.monotonic()
+        files = await self._run_blocking(_list_files)
+        self._list_cache[folder_id] = (fetched_at, files)
+        
+        return list(files)
+    
+    async def register_watch(
+        self,
+        channel_id: str,
+        webhook_url: str,
+        token: str
+    ) -> Dict[str, Any]:
+        """
+        Subscribe a webhook to Drive change notifications.
+        
+        Drive then pushes to webhook_url whenever something changes, so new
+        uploads are found without polling list_mp3_files (which remains the
+        cold-start/backfill path). A previously registered channel is stopped
+        once the new one exists, and the stored page token is kept, so
+        changes not yet processed are still returned by list_changed_mp3_files.
+        
+        Args:
+            channel_id: Unique ID for the notification channel
+            webhook_url: HTTPS URL that receives the notifications
+            token: Secret Drive echoes in X-Goog-Channel-Token
+        
+        Returns:
+            The created channel resource (id, resourceId, expiration)
+        """
+        await self.initialize()
+        
+        body = {
+            "id": channel_id,
+            "type": "web_hook",
+            "address": webhook_url,
+            "token": token,
+        }
+        previous = self.watch_channel
+        
+        def _watch():
+            page_token = self.changes_page_token
+            if page_token is None:
+                start = self.service.changes().getStartPageToken().execute()
+                page_token = start['startPageToken']
+            channel = self.service.changes().watch(pageToken=page_token, body=body).execute()
+            return page_token, channel
+        
+        def _stop(channel: Dict[str, Any]):
+            self.service.channels().stop(
+                body={"id": channel['id'], "resourceId": channel['resourceId']}
             ).execute()
-            return results.get('files', [])
         
-        loop = asyncio.get_event_loop()
-        files = await loop.run_in_executor(None, _list_files)
+        # Serialized with list_changed_mp3_files so the token is not read
+        # while a notification is advancing it
+        async with self._changes_lock:
+            self.changes_page_token, channel = await self._run_blocking(_watch)
+            self.watch_channel = channel
+        
+        if previous is not None:
+            try:
+                await self._run_blocking(_stop, previous)
+            except Exception as e:
+                # Usually already expired; Drive stops it on its own then
+                print(f"Failed to stop Drive channel {previous['id']}: {e}")
+        
+        return channel
+    
+    async def list_changed_mp3_files(self, folder_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List MP3 files added or modified in a folder since the last call.
+        
+        Reads the Drive changes feed from the stored page token and advances
+        it, so each change is returned once.
+        
+        Args:
+            folder_id: Folder to filter on (defaults to the configured folder)
+        
+        Returns:
+            Metadata of the changed MP3 files
+        """
+        await self.initialize()
+        
+        if self.changes_page_token is None:
+            raise RuntimeError("No Drive change watch registered")
+        
+        folder_id = folder_id or settings.google_drive_folder_id
+        
+        def _list_changes():
+            page_token = self.changes_page_token
+            changed = []
+            while True:
+                response = self.service.changes().list(
+                    pageToken=page_token,
+                    spaces='drive',
+                    pageSize=1000,
+                    fields=CHANGES_FIELDS
+                ).execute()
+                
+                for change in response.get('changes', []):
+                    file = change.get('file') or {}
+                    if (
+                        not change.get('removed')
+                        and not file.get('trashed')
+                        and file.get('mimeType') == 'audio/mpeg'
+                        and folder_id in file.get('parents', [])
+                    ):
+                        changed.append(file)
+                
+                if 'newStartPageToken' in response:
+                    return changed, response['newStartPageToken']
+                page_token = response['nextPageToken']
+        
+        # Concurrent notifications must not read the same page twice
+        async with self._changes_lock:
+            files, self.changes_page_token = await self._run_blocking(_list_changes)
+        
+        if files:
+            self._list_cache.pop(folder_id, None)
         
         return files
     
-    async def download_file(self, file_id: str, destination_path: str) -> str:
-        """Download a file from Google Drive."""
+    async def download_file(
+        self,
+        file_id: str,
+        destination_path: str,
+        size: Optional[int] = None
+    ) -> str:
+        """
+        Download a file from Google Drive, streaming each chunk straight to disk.
+        
+        All file system calls run on the Drive pool, so large downloads never
+        block the event loop.
+        
+        Args:
+            file_id: Google Drive file ID
+            destination_path: Local path to write the file to
+            size: File size in bytes from metadata, if known; used to
+                preallocate the destination file
+        
+        Returns:
+            The destination path
+        """
         await self.initialize()
         
-        def _download():
-            request = self.service.files().get_media(fileId=file_id)
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            
-            return fh.getvalue()
+        self._invalidate_list_cache(file_id)
+        
+        headers = await self._auth_headers()
+        
+        fd = None
+        write = None
+        try:
+            async with self.http_client.stream(
+                "GET",
+                f"{DRIVE_FILES_URL}/{file_id}",
+                params={"alt": "media"},
+                headers=headers
+            ) as response:
+                response.raise_for_status()
+                fd = await self._run_blocking(_open_for_download, destination_path, size)
+                
+                offset = 0
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    # Shielded: a cancelled download must not close the
+                    # descriptor under a write still running on the pool
+                    write = asyncio.ensure_future(
+                        self._run_blocking(_pwrite_all, fd, chunk, offset)
+                    )
+                    await asyncio.shield(write)
+                    offset += len(chunk)
+                
+                # Drop any preallocated tail beyond the bytes received
+                await self._run_blocking(os.ftruncate, fd, offset)
+        except BaseException:
+            # Leave the destination alone unless this call already truncated it
+            if fd is not None:
+                if write is not None:
+                    await asyncio.gather(write, return_exceptions=True)
+                await self._run_blocking(_discard_download, fd, destination_path)
+            raise
+        
+        await self._run_blocking(os.close, fd)
+        return destination_path
+    
+    async def download_file_parallel(
+        self,
+        file_id: str,
+        destination_path: str,
+        parts: int = 4,
+        size: Optional[int] = None
+    ) -> str:
+        """
+        Download a large file as concurrent HTTP range requests.
+        
+        The file is split into PARALLEL_RANGE_SIZE ranges, at most `parts` of
+        which are in flight at once, each written at its own offset of a
+        preallocated destination file. As in download_file, all file system
+        calls run on the Drive pool. Files under PARALLEL_DOWNLOAD_MIN_SIZE
+        fall back to download_file.
         
-        loop = asyncio.get_event_loop()
-        content = await loop.run_in_executor(None, _download)
+        Args:
+            file_id: Google Drive file ID
+            destination_path: Local path to write the file to
+            parts: Maximum concurrent range requests
+            size: File size in bytes, if already known from metadata
         
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+        Returns:
+            The destination path
+        """
+        if size is None:
+            metadata = await self.get_file_metadata(file_id)
+            size = int(metadata.get('size') or 0)
         
-        async with aiofiles.open(destination_path, 'wb') as f:
-            await f.write(content)
+        if parts <= 1 or size < PARALLEL_DOWNLOAD_MIN_SIZE:
+            return await self.download_file(file_id, destination_path, size=size or None)
         
+        await self.initialize()
+        
+        self._invalidate_list_cache(file_id)
+        
+        headers = await self._auth_headers()
+        url = f"{DRIVE_FILES_URL}/{file_id}"
+        semaphore = asyncio.Semaphore(parts)
+        # Writes still running on the pool; they are shielded from range
+        # cancellation and drained before the descriptor is closed
+        writes: Set[asyncio.Future] = set()
+        
+        async def _fetch_range(fd: int, start: int, end: int):
+            async with semaphore:
+                async with self.http_client.stream(
+                    "GET",
+                    url,
+                    params={"alt": "media"},
+                    headers={**headers, "Range": f"bytes={start}-{end}"}
+                ) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise RuntimeError(f"Range request not honored for file {file_id}")
+                    
+                    offset = start
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        write = asyncio.ensure_future(
+                            self._run_blocking(_pwrite_all, fd, chunk, offset)
+                        )
+                        writes.add(write)
+                        write.add_done_callback(writes.discard)
+                        await asyncio.shield(write)
+                        offset += len(chunk)
+        
+        fd = await self._run_blocking(_open_for_download, destination_path, size)
+        try:
+            tasks = [
+                asyncio.create_task(
+                    _fetch_range(fd, start, min(start + PARALLEL_RANGE_SIZE, size) - 1)
+                )
+                for start in range(0, size, PARALLEL_RANGE_SIZE)
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # Stop the remaining ranges before the descriptor is closed
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await asyncio.gather(*writes, return_exceptions=True)
+                raise
+        except BaseException:
+            await self._run_blocking(_discard_download, fd, destination_path)
+            raise
+        
+        await self._run_blocking(os.close, fd)
         return destination_path
     
-    async def get_file_metadata(self, file_id: str) -> Dict[str, Any]:
-        """Get metadata for a specific file."""
+    async def _batch_get_metadata(
+        self,
+        file_ids: List[str]
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+        """Fetch metadata for many files, METADATA_BATCH_SIZE per HTTP request."""
         await self.initialize()
         
-        def _get_metadata():
-            return self.service.files().get(
-                fileId=file_id,
-                fields='id, name, createdTime, modifiedTime, size, mimeType'
-            ).execute()
+        unique_ids = list(dict.fromkeys(file_ids))
+        results: Dict[str, Dict[str, Any]] = {}
+        errors: Dict[str, Exception] = {}
+        
+        def _collect(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+            else:
+                results[request_id] = response
+        
+        def _execute_batches():
+            for i in range(0, len(unique_ids), METADATA_BATCH_SIZE):
+                batch = self.service.new_batch_http_request(callback=_collect)
+                for file_id in unique_ids[i:i + METADATA_BATCH_SIZE]:
+                    batch.add(
+                        self.service.files().get(fileId=file_id, fields=FILE_METADATA_FIELDS),
+                        request_id=file_id
+                    )
+                batch.execute()
+        
+        await self._run_blocking(_execute_batches)
+        
+        return results, errors
+    
+    async def get_files_metadata(self, file_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get metadata for many files using Drive batch requests.
+        
+        Args:
+            file_ids: Google Drive file IDs
+        
+        Returns:
+            Metadata keyed by file ID; files that could not be fetched are omitted
+        """
+        results, errors = await self._batch_get_metadata(file_ids)
+        
+        for file_id, error in errors.items():
+            print(f"Failed to get metadata for {file_id}: {error}")
+        
+        return results
+    
+    async def get_file_metadata(self, file_id: str) -> Dict[str, Any]:
+        """Get metadata for a specific file."""
+        results, errors = await self._batch_get_metadata([file_id])
         
-        loop = asyncio.get_event_loop()
-        metadata = await loop.run_in_executor(None, _get_metadata)
+        if file_id in errors:
+            raise errors[file_id]
         
-        return metadata
+        return results[file_id]
 
 
 # Singleton instance
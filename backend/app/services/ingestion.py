@@ -0,0 +1,88 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+from app.config import get_settings
+from app.services.google_drive import google_drive_service
+from app.services.transcription import transcription_service
+
+settings = get_settings()
+
+
+class IngestionService:
+    """
+    Service for bulk-transcribing a Google Drive folder.
+    Downloads and transcriptions run as a bounded producer/consumer pipeline,
+    so the network stays busy while Whisper works and vice versa.
+    """
+    
+    async def stream_and_transcribe(
+        self,
+        folder_id: Optional[str] = None,
+        queue_size: Optional[int] = None,
+        workers: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Download every MP3 in a folder and transcribe it.
+        
+        One producer downloads files into a queue of at most queue_size
+        downloaded-but-untranscribed files; `workers` consumers transcribe
+        from it (Whisper API calls stay bounded by WHISPER_CONCURRENCY).
+        
+        Args:
+            folder_id: Drive folder (defaults to the configured folder)
+            queue_size: Maximum files waiting for transcription
+            workers: Number of concurrent transcription consumers
+        
+        Returns:
+            One dict per file with file_id, name, file_path and either
+            'transcription' or 'error'
+        """
+        queue_size = queue_size or settings.ingest_queue_size
+        workers = workers or settings.ingest_transcribe_workers
+        
+        files = await google_drive_service.list_mp3_files(folder_id)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        results: List[Dict[str, Any]] = []
+        
+        async def produce():
+            try:
+                for file in files:
+                    entry = {
+                        'file_id': file['id'],
+                        'name': file['name'],
+                        'file_path': os.path.join(settings.upload_dir, file['name']),
+                    }
+                    try:
+                        await google_drive_service.download_file_parallel(
+                            file['id'],
+                            entry['file_path'],
+                            size=int(file.get('size') or 0)
+                        )
+                    except Exception as e:
+                        print(f"Failed to download {file['name']}: {e}")
+                        results.append({**entry, 'error': str(e)})
+                        continue
+                    # Blocks while the queue is full, pausing downloads
+                    await queue.put(entry)
+            finally:
+                for _ in range(workers):
+                    await queue.put(None)
+        
+        async def consume():
+            while (entry := await queue.get()) is not None:
+                try:
+                    transcription = await transcription_service.transcribe_with_segments(
+                        entry['file_path']
+                    )
+                    results.append({**entry, 'transcription': transcription})
+                except Exception as e:
+                    print(f"Failed to transcribe {entry['name']}: {e}")
+                    results.append({**entry, 'error': str(e)})
+        
+        await asyncio.gather(produce(), *(consume() for _ in range(workers)))
+        
+        return results
+
+
+# Singleton instance
+ingestion_service = IngestionService()
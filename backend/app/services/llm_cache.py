@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional
+import diskcache
+from app.config import get_settings
+from app.services.embeddings import embed
+from app.services.semantic_cache import SemanticCache
+
+settings = get_settings()
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache for LLM response text.
+    An in-memory LRU of tasks (L1) collapses identical in-flight and repeated
+    prompts into a single Gemini call. Responses can also be stored on disk
+    (L2) keyed by BLAKE2b(model name + prompt), so re-running the pipeline
+    over the same recordings replays offline. Optionally, near-duplicate
+    inputs are served from an in-memory semantic cache.
+    """
+    
+    def __init__(self):
+        self._memory: OrderedDict[str, asyncio.Task] = OrderedDict()
+        self._disk: Optional[diskcache.Cache] = None
+        self._semantic: Dict[str, SemanticCache] = {}
+    
+    @staticmethod
+    def make_key(model_name: str, prompt: str) -> str:
+        """Build the cache key for a model/prompt pair."""
+        return hashlib.blake2b(f"{model_name}\n{prompt}".encode()).hexdigest()
+    
+    def _get_disk(self) -> diskcache.Cache:
+        if self._disk is None:
+            self._disk = diskcache.Cache(
+                settings.llm_cache_dir,
+                size_limit=settings.llm_cache_size_limit
+            )
+        return self._disk
+    
+    def _get_semantic(self, namespace: str) -> SemanticCache:
+        # One semantic index per call site, so e.g. a diarization input can
+        # never be answered with an email response
+        if namespace not in self._semantic:
+            self._semantic[namespace] = SemanticCache(
+                threshold=settings.semantic_cache_threshold
+            )
+        return self._semantic[namespace]
+    
+    async def get_or_generate(
+        self,
+        model_name: str,
+        prompt: str,
+        generate: Callable[[], Awaitable[str]],
+        semantic_text: Optional[str] = None,
+        semantic_namespace: str = "default"
+    ) -> str:
+        """
+        Return the cached response for this prompt, calling generate() on a miss.
+        
+        Concurrent callers with the same prompt await the same in-flight
+        task (single-flight), so only one of them reaches Gemini.
+        
+        Args:
+            model_name: Model the prompt is sent to (part of the key)
+            prompt: Full prompt text
+            generate: Coroutine function producing the response text
+            semantic_text: Input text to match semantically (the dynamic
+                part of the prompt); skipped when None
+            semantic_namespace: Semantic index to search, one per call site
+        
+        Returns:
+            Response text, from cache or freshly generated
+        """
+        key = self.make_key(model_name, prompt)
+        
+        if settings.llm_memory_cache_size <= 0:
+            return await self._resolve(key, generate, semantic_text, semantic_namespace)
+        
+        task = self._memory.get(key)
+        if task is not None:
+            self._memory.move_to_end(key)
+        else:
+            # The shared call runs as its own task, so no caller (not even
+            # the one that started it) can cancel it for the others
+            task = asyncio.create_task(
+                self._resolve(key, generate, semantic_text, semantic_namespace)
+            )
+            task.add_done_callback(partial(self._evict_failed, key))
+            self._memory[key] = task
+            if len(self._memory) > settings.llm_memory_cache_size:
+                self._memory.popitem(last=False)
+        
+        # Shield so a cancelled waiter only stops waiting
+        return await asyncio.shield(task)
+    
+    def _evict_failed(self, key: str, task: asyncio.Task) -> None:
+        """Drop a failed call from the memory tier; failures are not cached."""
+        # exception() also marks the error retrieved when nobody else waits
+        if task.cancelled() or task.exception() is not None:
+            if self._memory.get(key) is task:
+                del self._memory[key]
+    
+    async def _resolve(
+        self,
+        key: str,
+        generate: Callable[[], Awaitable[str]],
+        semantic_text: Optional[str],
+        semantic_namespace: str
+    ) -> str:
+        """Look the key up in the disk and semantic tiers, generating on a miss."""
+        if settings.llm_cache_enabled:
+            cached = await asyncio.to_thread(self._get_disk().get, key)
+            if cached is not None:
+                return cached
+        
+        embedding = None
+        if settings.semantic_cache_enabled and semantic_text:
+            embedding = await embed(semantic_text)
+            cached = self._get_semantic(semantic_namespace).lookup(embedding)
+            if cached is not None:
+                return cached
+        
+        response_text = await generate()
+        
+        if embedding is not None:
+            self._get_semantic(semantic_namespace).add(embedding, key, response_text)
+        if settings.llm_cache_enabled:
+            await asyncio.to_thread(self._get_disk().set, key, response_text)
+        
+        return response_text
+
+
+# Singleton instance
+llm_cache = LLMResponseCache()
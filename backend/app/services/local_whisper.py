@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+from app.config import get_settings
+
+settings = get_settings()
+
+# Process-wide faster-whisper models, keyed by model name
+_MODEL_CACHE: Dict[str, Any] = {}
+_MODEL_LOCK = threading.Lock()
+
+
+def get_whisper_model(name: Optional[str] = None):
+    """
+    Get the shared faster-whisper model for a model name, loading it once.
+    
+    Loading maps gigabytes of weights, so only the first caller pays for it;
+    concurrent first callers wait on the lock instead of loading twice.
+    """
+    name = name or settings.local_whisper_model
+    model = _MODEL_CACHE.get(name)
+    if model is not None:
+        return model
+    
+    with _MODEL_LOCK:
+        if name not in _MODEL_CACHE:
+            # Imported lazily: only needed when the local backend is selected
+            from faster_whisper import WhisperModel
+            
+            _MODEL_CACHE[name] = WhisperModel(
+                name,
+                device=settings.local_whisper_device,
+                compute_type=settings.local_whisper_compute_type,
+                # One decoding worker per allowed concurrent transcription
+                num_workers=settings.whisper_concurrency,
+            )
+    
+    return _MODEL_CACHE[name]
+
+
+class LocalWhisperBackend:
+    """
+    Offline transcription with faster-whisper (CTranslate2).
+    Results follow the Whisper API's verbose_json layout, so callers cannot
+    tell the two backends apart.
+    """
+    
+    @property
+    def model_name(self) -> str:
+        return f"faster-whisper-{settings.local_whisper_model}"
+    
+    async def prefetch(self) -> None:
+        """Load the configured model in a worker thread so requests start warm."""
+        await asyncio.to_thread(get_whisper_model)
+    
+    async def transcribe(self, audio_path: str, language: str = "en") -> Dict[str, Any]:
+        """
+        Transcribe an audio file on this machine.
+        
+        Args:
+            audio_path: Path to the audio file
+            language: Language code (default: English)
+        
+        Returns:
+            verbose_json-style dict with text, segments, duration and language
+        """
+        def _transcribe() -> Dict[str, Any]:
+            segments, info = get_whisper_model().transcribe(audio_path, language=language)
+            # segments is a lazy generator; decoding happens as it is consumed
+            segment_dicts = [
+                {
+                    "id": seg.id,
+                    "start": seg.start,
+                    "end": seg.end,
+                    "text": seg.text,
+                    "avg_logprob": seg.avg_logprob,
+                    "no_speech_prob": seg.no_speech_prob,
+                }
+                for seg in segments
+            ]
+            return {
+                "text": "".join(seg["text"] for seg in segment_dicts).strip(),
+                "segments": segment_dicts,
+                "duration": info.duration,
+                "language": info.language,
+            }
+        
+        return await asyncio.to_thread(_transcribe)
+
+
+# Singleton instance
+local_whisper_backend = LocalWhisperBackend()
@@ -0,0 +1,81 @@
+from typing import Dict, List, Optional
+import numpy as np
+
+
+class SemanticCache:
+    """
+    In-memory semantic cache for LLM responses.
+    Embeddings are stored L2-normalized as rows of one (N, d) float32 matrix,
+    so a lookup is a single BLAS matrix-vector product over every entry.
+    """
+    
+    def __init__(self, threshold: float = 0.92, max_entries: int = 10000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._mat: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._store: Dict[str, str] = {}
+        self._next_row = 0
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+    
+    def _reserve_row(self, dim: int) -> int:
+        """Return the row to write next, growing or wrapping the matrix."""
+        if self._mat is None:
+            self._mat = np.zeros((min(64, self.max_entries), dim), dtype=np.float32)
+        
+        row = self._next_row
+        if row < len(self._keys):
+            # Matrix is full: overwrite the oldest entry
+            del self._store[self._keys[row]]
+            del self._rows[self._keys[row]]
+        elif row == self._mat.shape[0]:
+            grown = np.zeros((min(row * 2, self.max_entries), dim), dtype=np.float32)
+            grown[:row] = self._mat
+            self._mat = grown
+        
+        self._next_row = (row + 1) % self.max_entries
+        return row
+    
+    def add(self, embedding: np.ndarray, key: str, response: str) -> None:
+        """
+        Store a response under its exact key and prompt embedding.
+        
+        Args:
+            embedding: Embedding of the text the response was generated from
+            key: Exact (content-addressed) cache key of the prompt
+            response: LLM response text
+        """
+        if key in self._rows:
+            self._store[key] = response
+            return
+        
+        vec = self._normalize(embedding)
+        row = self._reserve_row(vec.shape[0])
+        self._mat[row] = vec
+        
+        if row < len(self._keys):
+            self._keys[row] = key
+        else:
+            self._keys.append(key)
+        self._rows[key] = row
+        self._store[key] = response
+    
+    def lookup(self, embedding: np.ndarray) -> Optional[str]:
+        """Return the response of the most similar entry above the threshold."""
+        if not self._keys:
+            return None
+        
+        sims = self._mat[:len(self._keys)] @ self._normalize(embedding)
+        best = int(sims.argmax())
+        if sims[best] >= self.threshold:
+            return self._store[self._keys[best]]
+        return None
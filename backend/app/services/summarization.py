@@ -0,0 +1,99 @@
+from typing import Optional
+import google.generativeai as genai
+from app.config import get_settings
+from app.services.gemini import DETERMINISTIC_SAMPLING, get_model
+from app.services.llm_cache import llm_cache
+
+settings = get_settings()
+
+# Rough characters-per-token ratio for English transcripts
+CHARS_PER_TOKEN = 4
+
+
+SUMMARY_INSTRUCTIONS = """Consolidate the mortgage broker-client conversation transcript at the end of this prompt into a compact memory. The memory replaces the transcript both for writing the follow-up email and for extracting loan details and action items, so nothing important may be lost.
+
+Write short bullet points ("- ...") under these headings, omitting empty ones:
+DISCUSSION: what the client is looking for and the options and advice the broker gave
+PEOPLE: names and roles (broker, client, co-borrowers, employers, lenders)
+NUMBERS: loan amount, loan term, loan type, rates, prices, down payment, income, credit scores
+COMMITMENTS: what the broker or the client agreed to do or send, and who owns it
+DEADLINES: dates and timeframes, tied to the commitment they apply to
+
+Copy names, figures and dates exactly as stated. Keep negations and conditions (e.g. "not self-employed", "only if the rate drops"). Do not add anything that is not in the transcript.
+"""
+
+
+class SummarizationService:
+    """Service for condensing long transcripts into bounded summaries using Gemini AI."""
+    
+    def __init__(self):
+        self.model = None
+        self._initialized = False
+    
+    async def initialize(self):
+        """Initialize the Gemini AI model."""
+        if self._initialized:
+            return
+        
+        self.model = await get_model(settings.gemini_model)
+        self._initialized = True
+    
+    async def _generate(
+        self,
+        prompt: str,
+        generation_config: Optional[genai.GenerationConfig] = None
+    ) -> str:
+        """Send a prompt to Gemini and return the response text."""
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=generation_config
+        )
+        return response.text
+    
+    async def summarize_transcript(
+        self,
+        transcript: str,
+        max_tokens: int = 512,
+        instructions: str = SUMMARY_INSTRUCTIONS
+    ) -> str:
+        """
+        Summarize a transcript into at most max_tokens tokens.
+        
+        Transcripts shorter than settings.summary_min_compression times the
+        budget are returned unchanged, as summarizing them saves too little to
+        pay for the extra call. Summaries go through the content-addressed LLM cache, so every downstream call
+        for the same conversation shares one Gemini round-trip.
+        
+        Args:
+            transcript: The conversation transcript text
+            max_tokens: Output token budget for the summary
+        
+        Returns:
+            The summary, or the transcript itself if it is short enough
+        """
+        if len(transcript) < max_tokens * CHARS_PER_TOKEN * settings.summary_min_compression:
+            return transcript
+        
+        if self.model is None:
+            await self.initialize()
+        
+        prompt = (
+            f"{SUMMARY_INSTRUCTIONS}Keep the summary under {max_tokens * 3 // 4} words.\n"
+            f"\nTRANSCRIPT:\n{transcript}\n"
+        )
+        generation_config = genai.GenerationConfig(
+            **DETERMINISTIC_SAMPLING,
+            max_output_tokens=max_tokens
+        )
+        
+        summary = await llm_cache.get_or_generate(
+            settings.gemini_model,
+            prompt,
+            lambda: self._generate(prompt, generation_config)
+        )
+        
+        return summary.strip()
+
+
+# Singleton instance
+summarization_service = SummarizationService()
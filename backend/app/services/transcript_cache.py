@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import os
+from typing import Any, Dict, Optional
+import orjson
+from app.config import get_settings
+
+settings = get_settings()
+
+# Audio is hashed in pieces of this size so the file is never fully loaded
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class TranscriptCache:
+    """
+    On-disk cache of Whisper transcription results.
+    Entries are JSON files named by SHA-256(audio bytes | model | language |
+    response format), so re-transcribing the same recording is a file read
+    instead of an API call.
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or settings.transcript_cache_dir
+    
+    @property
+    def enabled(self) -> bool:
+        return settings.transcript_cache_enabled
+    
+    async def make_key(
+        self,
+        audio_path: str,
+        model: str,
+        language: str,
+        response_format: str
+    ) -> str:
+        """Hash the audio file incrementally together with the request options."""
+        def _hash() -> str:
+            digest = hashlib.sha256()
+            with open(audio_path, "rb") as f:
+                while chunk := f.read(HASH_CHUNK_SIZE):
+                    digest.update(chunk)
+            digest.update(f"|{model}|{language}|{response_format}".encode())
+            return digest.hexdigest()
+        
+        return await asyncio.to_thread(_hash)
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a key, or None on a miss."""
+        def _read() -> Optional[Dict[str, Any]]:
+            try:
+                with open(self._path(key), "rb") as f:
+                    return orjson.loads(f.read())
+            except (FileNotFoundError, orjson.JSONDecodeError):
+                return None
+        
+        return await asyncio.to_thread(_read)
+    
+    async def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result, writing atomically so readers never see partial files."""
+        # Serialize before the thread hop; numpy scalars from the local
+        # backend are handled natively
+        data = orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY)
+        
+        def _write():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        
+        await asyncio.to_thread(_write)
+
+
+# Singleton instance
+transcript_cache = TranscriptCache()
@@ -1,30 +1,169 @@
 import os
 import asyncio
-from typing import Optional, Dict, Any, List
+import mimetypes
+from typing import BinaryIO, Callable, Optional, Dict, Any, List
+import httpx
+import openai
 from openai import AsyncOpenAI
+from openai.types.audio import Transcription
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 from app.config import get_settings
+from app.services.local_whisper import local_whisper_backend
+from app.services.transcript_cache import transcript_cache
 
 settings = get_settings()
 
+WHISPER_MODEL = "whisper-1"
+
+# Keep TLS connections to the API warm across concurrent uploads; long
+# recordings can take minutes to transcribe, hence the generous read timeout
+OPENAI_HTTP_LIMITS = httpx.Limits(
+    max_connections=64,
+    max_keepalive_connections=32,
+    keepalive_expiry=60
+)
+OPENAI_HTTP_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+_rate_limit_backoff = wait_exponential_jitter(initial=1, max=60)
+
+
+def _wait_for_rate_limit(retry_state: RetryCallState) -> float:
+    """Wait as long as the 429's Retry-After asks, else back off exponentially."""
+    error = retry_state.outcome.exception()
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return min(float(retry_after), 60.0)
+    except (TypeError, ValueError):
+        return _rate_limit_backoff(retry_state)
+
+
+def _model_dump(transcription: Any) -> Dict[str, Any]:
+    return transcription.model_dump()
+
+
+def _from_attrs(transcription: Any) -> Dict[str, Any]:
+    return {
+        "text": getattr(transcription, 'text', None) or str(transcription),
+        "segments": getattr(transcription, 'segments', []),
+        "words": getattr(transcription, 'words', []),
+        "duration": getattr(transcription, 'duration', None)
+    }
+
+
+def _normalize_segment(seg: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a Whisper segment to {start, end, text, confidence}."""
+    return {
+        'start': seg.get('start', 0),
+        'end': seg.get('end', 0),
+        'text': (seg.get('text') or '').strip(),
+        'confidence': seg.get('avg_logprob')
+    }
+
+
+def _is_up_to_date(derived_path: str, source_path: str) -> bool:
+    """Whether derived_path exists and is at least as new as source_path."""
+    return (
+        os.path.exists(derived_path)
+        and os.path.getmtime(derived_path) >= os.path.getmtime(source_path)
+    )
+
+
+def _remove_if_exists(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _log_prefetch_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Whisper model prefetch failed: {task.exception()}")
+
 
 class TranscriptionService:
-    """Service for transcribing audio files using OpenAI Whisper API."""
+    """
+    Service for transcribing audio files with Whisper, either through the
+    OpenAI API or locally with faster-whisper (settings.whisper_backend).
+    """
     
     def __init__(self):
         self.client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._to_dict: Callable[[Any], Dict[str, Any]] = _from_attrs
         self._initialized = False
     
+    @property
+    def uses_local_backend(self) -> bool:
+        return settings.whisper_backend == "local"
+    
     async def initialize(self):
-        """Initialize the OpenAI client."""
+        """Initialize the OpenAI client (or just the concurrency limit for local)."""
         if self._initialized:
             return
         
-        if settings.openai_api_key:
-            self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        if self.uses_local_backend:
+            self._semaphore = asyncio.Semaphore(settings.whisper_concurrency)
+            # Start loading the model now; transcriptions that arrive before
+            # it finishes simply wait on the model cache lock
+            self._prefetch_task = asyncio.create_task(local_whisper_backend.prefetch())
+            self._prefetch_task.add_done_callback(_log_prefetch_failure)
+            self._initialized = True
+        elif settings.openai_api_key:
+            self.client = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                # _create_transcription owns retries; SDK retries would stack
+                # on top of it and sleep while holding a semaphore slot
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    http2=True,
+                    limits=OPENAI_HTTP_LIMITS,
+                    timeout=OPENAI_HTTP_TIMEOUT
+                )
+            )
+            # The SDK's response types are fixed per install, so pick the
+            # conversion once instead of probing every response
+            if hasattr(Transcription, 'model_dump'):
+                self._to_dict = _model_dump
+            self._semaphore = asyncio.Semaphore(settings.whisper_concurrency)
             self._initialized = True
         else:
             raise ValueError("OpenAI API key not configured")
     
+    async def close(self):
+        """Close the pooled HTTP client behind the OpenAI client."""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            self._initialized = False
+    
+    @retry(
+        retry=retry_if_exception_type(openai.RateLimitError),
+        wait=_wait_for_rate_limit,
+        stop=stop_after_attempt(8),
+        reraise=True
+    )
+    async def _create_transcription(
+        self,
+        audio_file: BinaryIO,
+        filename: str,
+        content_type: str,
+        **kwargs: Any
+    ) -> Any:
+        """Call the Whisper API, bounded by the concurrency limit and retried on 429."""
+        # A retry must upload the whole file again
+        audio_file.seek(0)
+        async with self._semaphore:
+            return await self.client.audio.transcriptions.create(
+                file=(filename, audio_file, content_type),
+                **kwargs
+            )
+    
     async def transcribe_audio(
         self,
         audio_path: str,
@@ -32,40 +171,110 @@ class TranscriptionService:
         response_format: str = "verbose_json"
     ) -> Dict[str, Any]:
         """
-        Transcribe an audio file using OpenAI Whisper API.
+        Transcribe an audio file with the configured Whisper backend.
         
         Args:
             audio_path: Path to the audio file
             language: Language code (default: English)
-            response_format: Output format (verbose_json includes timestamps)
+            response_format: Output format (verbose_json includes timestamps);
+                the local backend always produces verbose_json
         
         Returns:
             Transcription result with text and segments
         """
         await self.initialize()
         
-        with open(audio_path, "rb") as audio_file:
-            transcription = await self.client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language=language,
-                response_format=response_format,
-                timestamp_granularities=["segment", "word"]
+        model_name = local_whisper_backend.model_name if self.uses_local_backend else WHISPER_MODEL
+        
+        cache_key = None
+        if transcript_cache.enabled:
+            cache_key = await transcript_cache.make_key(
+                audio_path, model_name, language, response_format
             )
+            cached = await transcript_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        # Convert to dict if needed
-        if hasattr(transcription, 'model_dump'):
-            result = transcription.model_dump()
+        if self.uses_local_backend:
+            async with self._semaphore:
+                result = await local_whisper_backend.transcribe(audio_path, language)
         else:
-            result = {
-                "text": transcription.text if hasattr(transcription, 'text') else str(transcription),
-                "segments": getattr(transcription, 'segments', []),
-                "words": getattr(transcription, 'words', []),
-                "duration": getattr(transcription, 'duration', None)
-            }
+            result = await self._transcribe_remote(audio_path, language, response_format)
+        
+        if cache_key is not None:
+            try:
+                await transcript_cache.put(cache_key, result)
+            except (OSError, TypeError) as e:
+                print(f"Failed to cache transcript: {e}")
         
         return result
     
+    async def _preencode(self, audio_path: str) -> str:
+        """
+        Transcode audio to 16 kHz mono Opus for upload.
+        
+        The encoded file is kept next to the original and reused while it is
+        newer than the source, so re-runs skip ffmpeg.
+        
+        Returns:
+            Path to the encoded file
+        """
+        # Named after the full source path, so call.mp3 and call.wav never
+        # share (and reuse) one encoding
+        encoded_path = f"{audio_path}.16k.ogg"
+        if await asyncio.to_thread(_is_up_to_date, encoded_path, audio_path):
+            return encoded_path
+        
+        partial_path = f"{encoded_path}.part"
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-nostdin", "-y", "-loglevel", "error",
+            "-i", audio_path,
+            "-ac", "1", "-ar", "16000",
+            "-c:a", "libopus", "-b:a", "24k",
+            "-f", "ogg", partial_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        
+        if process.returncode != 0:
+            await asyncio.to_thread(_remove_if_exists, partial_path)
+            raise RuntimeError(f"ffmpeg exited with {process.returncode}: {stderr.decode(errors='replace').strip()}")
+        
+        await asyncio.to_thread(os.replace, partial_path, encoded_path)
+        return encoded_path
+    
+    async def _transcribe_remote(
+        self,
+        audio_path: str,
+        language: str,
+        response_format: str
+    ) -> Dict[str, Any]:
+        """Transcribe through the OpenAI Whisper API."""
+        upload_path = audio_path
+        if settings.whisper_preencode:
+            try:
+                upload_path = await self._preencode(audio_path)
+            except (OSError, RuntimeError) as e:
+                print(f"Audio pre-encode failed, uploading original file: {e}")
+        
+        # open() can block on cold storage, so keep it off the event loop
+        audio_file = await asyncio.to_thread(open, upload_path, "rb")
+        try:
+            transcription = await self._create_transcription(
+                audio_file,
+                os.path.basename(upload_path),
+                mimetypes.guess_type(upload_path)[0] or "audio/mpeg",
+                model=WHISPER_MODEL,
+                language=language,
+                response_format=response_format,
+                timestamp_granularities=["segment", "word"]
+            )
+        finally:
+            audio_file.close()
+        
+        return self._to_dict(transcription)
+    
     async def transcribe_with_segments(
         self,
         audio_path: str,
@@ -86,14 +295,7 @@ class TranscriptionService:
             response_format="verbose_json"
         )
         
-        segments = []
-        for seg in result.get('segments', []):
-            segments.append({
-                'start': seg.get('start', 0),
-                'end': seg.get('end', 0),
-                'text': seg.get('text', '').strip(),
-                'confidence': seg.get('avg_logprob', 0) if 'avg_logprob' in seg else None
-            })
+        segments = [_normalize_segment(seg) for seg in result.get('segments') or ()]
         
         return {
             'text': result.get('text', ''),
@@ -101,6 +303,45 @@ class TranscriptionService:
             'duration': result.get('duration'),
             'language': result.get('language', language)
         }
+    
+    async def transcribe_batch(
+        self,
+        audio_paths: List[str],
+        language: str = "en"
+    ) -> List[Dict[str, Any]]:
+        """
+        Transcribe several audio files concurrently and return structured segments.
+        
+        At most settings.whisper_concurrency files are in flight at once, which
+        bounds hashing and pre-encoding as well as the Whisper calls.
+        
+        Args:
+            audio_paths: Paths to the audio files
+            language: Language code (default: English)
+        
+        Returns:
+            One transcribe_with_segments dict per path, in input order; a file
+            that fails yields {'error': ...} instead
+        """
+        semaphore = asyncio.Semaphore(settings.whisper_concurrency)
+        
+        async def _transcribe(path: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.transcribe_with_segments(path, language=language)
+        
+        results = await asyncio.gather(
+            *(_transcribe(path) for path in audio_paths),
+            return_exceptions=True
+        )
+        
+        batch = []
+        for path, result in zip(audio_paths, results):
+            if isinstance(result, BaseException):
+                print(f"Failed to transcribe {path}: {result}")
+                result = {'error': str(result)}
+            batch.append(result)
+        
+        return batch
 
 
 # Singleton instance